@@ -1,26 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.templating import Jinja2Templates
 from database import get_db
 from shemas import UserCreate, UserResponse
 from models import User
-from passlib.context import CryptContext
-from api_service.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from passwords import password_hasher
+from rate_limit import login_rate_limit, register_rate_limit, login_failed, login_succeeded
+from security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 router = APIRouter(prefix="/auth", tags=["auth"])
 web_router = APIRouter(prefix="/web", tags=["auth-web"])
-templates = Jinja2Templates(directory='static/html')
 
 
-@router.post('/register/', response_model=UserResponse)
+@router.post('/register/', response_model=UserResponse, dependencies=[Depends(register_rate_limit)])
 async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     existing_user = await db.execute(select(User).filter((User.username == user.username) | (User.email == user.email)))
     if existing_user.scalars().first():
         raise HTTPException(400, 'Пользователь с таким именем или почтой уже существует!')
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
 
     new_user = User(username=user.username,
                     email=user.email,
@@ -31,19 +29,22 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     return new_user
 
 
-@router.post("/login/", response_model=dict)
+@router.post("/login/", response_model=dict, dependencies=[Depends(login_rate_limit)])
 async def login(
+        request: Request,
         form_data: OAuth2PasswordRequestForm = Depends(),
         db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.username == form_data.username))
     user = result.scalars().first()
 
-    if not user or not pwd_context.verify(form_data.password, user.hash_password):
+    if not user or not await password_hasher.verify(form_data.password, user.hash_password):
+        await login_failed(form_data.username)
         raise HTTPException(
             status_code=401,
             detail="Неверное имя пользователя или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await login_succeeded(request, form_data.username)
     access_token = create_access_token(data={"sub": user.username})
     return {
         "access_token": access_token,
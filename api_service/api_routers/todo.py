@@ -1,24 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update, delete
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from shemas import ToDoCreate, ToDoResponse, ToDoUpdate
-from models import User, ToDo
-from api_service.security import get_current_user
+from shemas import ToDoCreate, ToDoResponse, ToDoUpdate, ToDoBulkUpdate, ToDoBulkRequest, ToDoBulkResponse, \
+    BulkItemResult, ToDoImportResponse, ToDoChangesResponse, ToDoStatsResponse
+from models import ToDo, ToDoArchive
+from archive import restore_archived, delete_archived
+from security import get_current_user, get_read_db
+from auth_cache import CurrentUser
+from task_queries import list_tasks, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from task_versions import bump_tasks_version, record_deletions, get_tasks_version, get_changes, tasks_etag, \
+    etag_matches
+from task_io import stream_tasks, import_tasks as import_task_rows, validation_detail
+from json_response import FastJSONResponse, task_list_payload
+from task_stats import get_task_stats, recompute_task_stats
 
 router = APIRouter(prefix="/api/tasks", tags=["api tasks"])
 
 
 @router.post('/create/', status_code=201)
 async def create_task(task: ToDoCreate, db: AsyncSession = Depends(get_db),
-                      current_user: User = Depends(get_current_user)):
+                      current_user: CurrentUser = Depends(get_current_user)):
     if not task.title:
         HTTPException(status_code=400, detail='Нет названия задачи')
     new_task = ToDo(**task.model_dump(), user_id=current_user.id)
     try:
+        new_task.version = await bump_tasks_version(db, current_user.id)
         db.add(new_task)
         await db.commit()
-        await db.refresh(new_task)
     except Exception as e:
         print(new_task)
         print(e)
@@ -28,42 +39,204 @@ async def create_task(task: ToDoCreate, db: AsyncSession = Depends(get_db),
 
 
 @router.get('/mytasks/', response_model=list[ToDoResponse])
-async def get_tasks(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    my_tasks = await db.execute(select(ToDo).filter(ToDo.user_id == current_user.id))
-    tasks = my_tasks.scalars().all()
-    return tasks
+async def get_tasks(request: Request, query: str | None = None, status: str | None = None,
+                    date_from: str | None = None, date_to: str | None = None,
+                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str | None = None,
+                    include_archived: bool = False,
+                    db: AsyncSession = Depends(get_read_db), current_user: CurrentUser = Depends(get_current_user)):
+    # Если задачи не менялись с прошлого опроса, отвечаем 304, не читая todos
+    etag = tasks_etag(request, current_user.id, await get_tasks_version(db, current_user.id))
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    tasks, next_cursor = await list_tasks(db, current_user.id, query, status, date_from, date_to, limit, after,
+                                          include_archived)
+    if next_cursor:
+        cache_headers["X-Next-Cursor"] = next_cursor
+    # Строки уже в форме ToDoResponse: сериализуем напрямую, минуя валидацию response_model
+    return FastJSONResponse(task_list_payload(tasks), headers=cache_headers)
+
+
+@router.get('/changes/', response_model=ToDoChangesResponse)
+async def get_task_changes(since: int | None = Query(None, ge=0), after: str | None = None,
+                           db: AsyncSession = Depends(get_read_db),
+                           current_user: CurrentUser = Depends(get_current_user)):
+    if since is not None and after:
+        raise HTTPException(status_code=400, detail='Курсор after - только для полной синхронизации (без since)')
+    return await get_changes(db, current_user.id, since, after)
+
+
+@router.get('/stats/', response_model=ToDoStatsResponse)
+async def task_stats(db: AsyncSession = Depends(get_read_db), current_user: CurrentUser = Depends(get_current_user)):
+    return await get_task_stats(db, current_user.id)
+
+
+@router.post('/stats/recompute/', response_model=ToDoStatsResponse)
+async def recompute_stats(db: AsyncSession = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
+    try:
+        return await recompute_task_stats(db, current_user.id)
+    except Exception as e:
+        print(e)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail='Проблемы у сервера')
+
+
+@router.get('/export/')
+async def export_tasks(export_format: str = Query('ndjson', alias='format', pattern='^(ndjson|csv)$'),
+                       current_user: CurrentUser = Depends(get_current_user)):
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        stream_tasks(current_user.id, export_format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="tasks.{export_format}"'},
+    )
+
+
+@router.post('/import/', response_model=ToDoImportResponse)
+async def import_tasks(request: Request,
+                       import_format: str = Query('ndjson', alias='format', pattern='^(ndjson|csv)$'),
+                       db: AsyncSession = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
+    try:
+        return await import_task_rows(db, current_user.id, request.stream(), import_format)
+    except Exception as e:
+        print(e)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail='Проблемы у сервера')
 
 
 @router.patch('/update/{task_id}/', response_model=ToDoResponse)
 async def update_task(task_id: int, tododata: ToDoUpdate, db: AsyncSession = Depends(get_db),
-                      current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id))
-    task = result.scalars().first()
-    if not task:
-        raise HTTPException(status_code=404)
+                      current_user: CurrentUser = Depends(get_current_user)):
+    values = tododata.model_dump(exclude_unset=True)
+    if values:
+        # Проверка владельца, изменение и чтение результата - одним UPDATE ... RETURNING
+        stmt = update(ToDo).where(ToDo.id == task_id, ToDo.user_id == current_user.id).values(**values) \
+            .returning(ToDo).execution_options(synchronize_session=False)
+    else:
+        stmt = select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id)
     try:
-        await db.execute(update(ToDo).where(ToDo.id == task_id).values(**tododata.model_dump(exclude_unset=True)))
-        await db.commit()
+        if values:
+            stmt = stmt.values(version=await bump_tasks_version(db, current_user.id))
+        result = await db.execute(stmt)
+        task = result.scalars().first()
+        if task is None and values:
+            # Архивная задача меняется после возврата в todos
+            if await restore_archived(db, current_user.id, [task_id]):
+                result = await db.execute(stmt)
+                task = result.scalars().first()
+        elif task is None:
+            result = await db.execute(select(ToDoArchive).filter(ToDoArchive.id == task_id,
+                                                                 ToDoArchive.user_id == current_user.id))
+            task = result.scalars().first()
+        # Чужая или несуществующая задача: откатываем и увеличение версии
+        await (db.commit() if task else db.rollback())
     except Exception as e:
         print(e)
         await db.rollback()
         raise HTTPException(status_code=500)
-    await db.refresh(task)
+    if not task:
+        raise HTTPException(status_code=404)
     return task
 
 
 @router.delete('/delete/{task_id}/', status_code=204)
-async def delete_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id))
-    task = result.scalars().first()
-
-    if not task:
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
+    try:
+        version = await bump_tasks_version(db, current_user.id)
+        result = await db.execute(delete(ToDo).where(ToDo.id == task_id, ToDo.user_id == current_user.id)
+                                  .returning(ToDo.id))
+        deleted_id = result.scalars().first()
+        if deleted_id is None:
+            deleted_id = next(iter(await delete_archived(db, current_user.id, [task_id])), None)
+        if deleted_id is not None:
+            await record_deletions(db, current_user.id, [deleted_id], version)
+            await db.commit()
+        else:
+            await db.rollback()
+    except Exception as e:
+        print(e)
+        await db.rollback()
+        raise HTTPException(status_code=500)
+    if deleted_id is None:
         raise HTTPException(status_code=404)
+
+
+@router.post('/bulk/', response_model=ToDoBulkResponse)
+async def bulk_tasks(operations: ToDoBulkRequest, db: AsyncSession = Depends(get_db),
+                     current_user: CurrentUser = Depends(get_current_user)):
+    """Пакетное создание, изменение и удаление задач в одной транзакции.
+
+    Владение проверяется одним запросом, создание - одним многострочным INSERT ... RETURNING,
+    удаление - одним DELETE ... RETURNING. Результат возвращается по каждому элементу.
+    """
+    results = {'create': [], 'update': [], 'delete': []}
+    creates, updates = [], []
+    for index, item in enumerate(operations.create):
+        try:
+            creates.append((index, ToDoCreate.model_validate(item)))
+        except ValidationError as e:
+            results['create'].append(BulkItemResult(index=index, status=422, detail=validation_detail(e)))
+    for index, item in enumerate(operations.update):
+        try:
+            updates.append((index, ToDoBulkUpdate.model_validate(item)))
+        except ValidationError as e:
+            results['update'].append(BulkItemResult(index=index, status=422, detail=validation_detail(e)))
+
+    owned = set()
+    requested_ids = {task.id for _, task in updates} | set(operations.delete)
+    version = None
     try:
-        await db.execute(delete(ToDo).where(ToDo.id == task_id))
+        if creates or requested_ids:
+            version = await bump_tasks_version(db, current_user.id)
+        if requested_ids:
+            # FOR UPDATE держит строки до коммита, чтобы их не удалили между проверкой и записью
+            result = await db.execute(select(ToDo.id).filter(ToDo.id.in_(requested_ids),
+                                                             ToDo.user_id == current_user.id).with_for_update())
+            owned = set(result.scalars().all())
+
+        # Чего нет в todos, ищется в архиве: изменяемые задачи возвращаются в todos, удаляемые удаляются оттуда
+        archived_deletes = await delete_archived(db, current_user.id,
+                                                 set(operations.delete) - owned - {task.id for _, task in updates})
+        owned |= await restore_archived(db, current_user.id, requested_ids - owned - archived_deletes)
+        if creates:
+            result = await db.execute(
+                insert(ToDo).returning(ToDo.id, sort_by_parameter_order=True),
+                [dict(task.model_dump(), user_id=current_user.id, version=version) for _, task in creates]
+            )
+            for (index, _), task_id in zip(creates, result.scalars().all()):
+                results['create'].append(BulkItemResult(index=index, id=task_id, status=201))
+
+        values = []
+        for index, task in updates:
+            if task.id not in owned:
+                results['update'].append(BulkItemResult(index=index, id=task.id, status=404))
+                continue
+            # None в пакете означает "не менять поле"
+            changes = task.model_dump(exclude_unset=True, exclude_none=True)
+            if len(changes) > 1:
+                values.append(dict(changes, version=version))
+            results['update'].append(BulkItemResult(index=index, id=task.id, status=200))
+        if values:
+            # UPDATE по первичному ключу, executemany
+            await db.execute(update(ToDo), values)
+
+        delete_ids = [task_id for task_id in operations.delete if task_id in owned]
+        deleted = set(archived_deletes)
+        if delete_ids:
+            result = await db.execute(delete(ToDo).where(ToDo.id.in_(delete_ids), ToDo.user_id == current_user.id)
+                                      .returning(ToDo.id))
+            deleted |= set(result.scalars().all())
+        await record_deletions(db, current_user.id, deleted, version)
+        for index, task_id in enumerate(operations.delete):
+            results['delete'].append(BulkItemResult(index=index, id=task_id, status=204 if task_id in deleted else 404))
+
         await db.commit()
     except Exception as e:
         print(e)
         await db.rollback()
-        raise HTTPException(status_code=500)
+        raise HTTPException(status_code=500, detail='Проблемы у сервера')
 
+    for key in results:
+        results[key].sort(key=lambda item: item.index)
+    return results
@@ -1,39 +0,0 @@
-from environs import Env
-from datetime import datetime, timedelta, timezone
-# from jose import JWTError, jwt
-import jwt
-from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
-from models import User
-from sqlalchemy.future import select
-
-env = Env()
-env.read_env()
-SECRET_KEY = env('SECRET_KEY')
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/web/login/")
-
-
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user = await db.execute(select(User).filter(User.username == username))
-    user = user.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
@@ -0,0 +1,120 @@
+import time
+from datetime import date, timedelta
+from sqlalchemy import select, update, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session
+from models import User, ToDo, ToDoArchive, task_status
+from metrics import registry, Counter, Histogram
+from task_events import tasks_changed
+from settings import env
+
+ARCHIVE_ENABLED = env.bool('ARCHIVE_ENABLED', True)
+# Выполненная задача уходит в архив, когда с даты плана прошло столько дней
+ARCHIVE_AFTER_DAYS = env.int('ARCHIVE_AFTER_DAYS', 30)
+# Задач в одной транзакции: строки пользователей блокируются ненадолго
+ARCHIVE_BATCH_SIZE = env.int('ARCHIVE_BATCH_SIZE', 200)
+# Пачек за один проход планировщика, остаток перенесётся на следующем
+ARCHIVE_MAX_BATCHES = env.int('ARCHIVE_MAX_BATCHES', 50)
+
+ARCHIVE_COLUMNS = ('id', 'title', 'status', 'description', 'created', 'plan_date', 'user_id', 'version')
+
+MOVED = registry.register(Counter('archive_tasks_moved_total', 'Задачи, перенесённые в todos_archive'))
+BATCH_DURATION = registry.register(Histogram('archive_batch_duration_seconds', 'Время переноса пачки в архив'))
+
+
+def archive_candidates(cutoff: date, batch_size: int = ARCHIVE_BATCH_SIZE):
+    # Читается по ix_todos_status_plan_date_id сразу с выполненных задач: невыполненные старые
+    # задачи, которых со временем только больше, не просматриваются на каждом проходе
+    return select(ToDo.id, ToDo.user_id) \
+        .where(ToDo.status == task_status.DONE, ToDo.plan_date < cutoff) \
+        .order_by(ToDo.plan_date, ToDo.id) \
+        .limit(batch_size)
+
+
+async def archive_batch(cutoff: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Переносит в todos_archive до ``batch_size`` выполненных задач с plan_date раньше ``cutoff``.
+
+    Перенос - это запись задач: версия пользователя растёт, и кэши списков сбрасываются, как
+    после любой записи. Сами задачи не меняются, поэтому дельта-синхронизация их не присылает.
+    Пользователей, которых сейчас кто-то пишет, пачка пропускает (SKIP LOCKED).
+    """
+    start = time.perf_counter()
+    async with async_session() as db:
+        result = await db.execute(archive_candidates(cutoff, batch_size))
+        candidates = result.all()
+        if not candidates:
+            return 0
+        result = await db.execute(
+            select(User.id).where(User.id.in_({row.user_id for row in candidates}))
+            .order_by(User.id).with_for_update(skip_locked=True)
+        )
+        locked = set(result.scalars())
+        # Пока пользователь не был заблокирован, его задачу могли изменить или удалить
+        result = await db.execute(
+            select(ToDo.id, ToDo.user_id).where(ToDo.id.in_([row.id for row in candidates if row.user_id in locked]),
+                                                ToDo.status == task_status.DONE, ToDo.plan_date < cutoff)
+        )
+        rows = result.all()
+        if not rows:
+            await db.rollback()
+            return 0
+        task_ids = [row.id for row in rows]
+
+        result = await db.execute(
+            update(User).where(User.id.in_({row.user_id for row in rows}))
+            .values(tasks_version=User.tasks_version + 1).returning(User.id, User.tasks_version)
+            .execution_options(synchronize_session=False, user_snapshot_unchanged=True)
+        )
+        for user_id, version in result:
+            tasks_changed(db, user_id, version)
+        await db.execute(insert(ToDoArchive).from_select(
+            ARCHIVE_COLUMNS, select(*(getattr(ToDo, name) for name in ARCHIVE_COLUMNS)).where(ToDo.id.in_(task_ids))
+        ))
+        await db.execute(delete(ToDo).where(ToDo.id.in_(task_ids)).execution_options(synchronize_session=False))
+        await db.commit()
+    MOVED.inc(amount=len(task_ids))
+    BATCH_DURATION.observe(value=time.perf_counter() - start)
+    return len(task_ids)
+
+
+async def restore_archived(db: AsyncSession, user_id: int, task_ids) -> set[int]:
+    """Возвращает архивные задачи пользователя в todos в текущей транзакции, id сохраняются.
+
+    Так архивная задача меняется как обычная: в todos_archive нет триггеров на UPDATE для
+    todo_stats и FTS, а выполненную и старую задачу архиватор снова перенесёт следующим проходом.
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return set()
+    result = await db.execute(
+        delete(ToDoArchive).where(ToDoArchive.id.in_(task_ids), ToDoArchive.user_id == user_id)
+        .returning(*(getattr(ToDoArchive, name) for name in ARCHIVE_COLUMNS))
+    )
+    rows = result.mappings().all()
+    if rows:
+        await db.execute(insert(ToDo), [dict(row) for row in rows])
+    return {row['id'] for row in rows}
+
+
+async def delete_archived(db: AsyncSession, user_id: int, task_ids) -> set[int]:
+    """Удаляет архивные задачи пользователя и возвращает их id; надгробия пишет вызывающий."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return set()
+    result = await db.execute(delete(ToDoArchive).where(ToDoArchive.id.in_(task_ids), ToDoArchive.user_id == user_id)
+                              .returning(ToDoArchive.id))
+    return set(result.scalars())
+
+
+async def archive_done_tasks(today: date | None = None) -> int:
+    """Один проход архиватора: пачки по отдельным транзакциям, пока есть что переносить."""
+    if not ARCHIVE_ENABLED:
+        return 0
+    cutoff = (today or date.today()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    moved = 0
+    for _ in range(ARCHIVE_MAX_BATCHES):
+        batch = await archive_batch(cutoff)
+        moved += batch
+        if batch < ARCHIVE_BATCH_SIZE:
+            break
+    return moved
@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import User
+from invalidation import bus
+from settings import env
+
+USER_CACHE_TTL = env.float('USER_CACHE_TTL', 60.0)
+USER_CACHE_SIZE = env.int('USER_CACHE_SIZE', 10000)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Снимок пользователя для авторизации: неизменяемый, без hash_password и ORM-состояния,
+    поэтому один объект безопасно делить между запросами и сессиями."""
+    id: int
+    username: str
+
+
+class UserCache:
+    """Ограниченный in-process кэш пользователей (TTL + LRU), ключ - sub из токена.
+
+    Поколение растёт при каждой инвалидации: снимок, прочитанный до неё, в кэш не попадёт,
+    даже если запрос закончит чтение уже после коммита изменившей пользователя транзакции.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, CurrentUser]] = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username: str) -> CurrentUser | None:
+        item = self._items.get(username)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, user = item
+        if expires < time.monotonic():
+            del self._items[username]
+            self.misses += 1
+            return None
+        self._items.move_to_end(username)
+        self.hits += 1
+        return user
+
+    def set(self, username: str, user: CurrentUser, generation: int | None = None):
+        if generation is not None and generation != self.generation:
+            return
+        self._items[username] = (time.monotonic() + self.ttl, user)
+        self._items.move_to_end(username)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, username: str):
+        self.generation += 1
+        self._items.pop(username, None)
+
+    def clear(self):
+        self.generation += 1
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+user_cache = UserCache()
+
+
+async def load_user(username: str, db: AsyncSession) -> CurrentUser | None:
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+    generation = user_cache.generation
+    result = await db.execute(select(User.id, User.username).filter(User.username == username))
+    row = result.first()
+    if row is None:
+        return None
+    user = CurrentUser(id=row.id, username=row.username)
+    user_cache.set(username, user, generation)
+    return user
+
+
+@bus.on('user')
+def _invalidate_usernames(*usernames):
+    for username in usernames:
+        user_cache.invalidate(username)
+
+
+@bus.on('user_reset')
+def _invalidate_all_users():
+    user_cache.clear()
+
+
+bus.on_reset(user_cache.clear)
+
+
+# События публикуются в сессию при flush, а кэш сбрасывается только после коммита (во всех
+# воркерах через шину инвалидации); при откате события отбрасываются
+@event.listens_for(User, 'after_update')
+def _invalidate_updated_user(mapper, connection, target):
+    # При смене имени сбрасываем и запись под старым sub
+    bus.publish(object_session(target), 'user', target.username,
+                *inspect(target).attrs.username.history.deleted)
+
+
+@event.listens_for(User, 'after_delete')
+def _invalidate_deleted_user(mapper, connection, target):
+    bus.publish(object_session(target), 'user', target.username)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_on_bulk_write(orm_execute_state):
+    # UPDATE/DELETE users через Core не вызывает mapper-событий и не говорит, каких пользователей
+    # задел, поэтому сбрасывается весь кэш. Запросы, не меняющие полей снимка (версия задач),
+    # помечаются execution_options(user_snapshot_unchanged=True)
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.bind_mapper is not inspect(User):
+        return
+    if orm_execute_state.execution_options.get('user_snapshot_unchanged'):
+        return
+    bus.publish(orm_execute_state.session, 'user_reset')
@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+DEFAULT_DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(tempfile.gettempdir(), 'todo_benchmark.db')}"
+USERNAME_TEMPLATE = 'bench-user-{}'
+PASSWORD = 'benchmark'
+
+
+def configure(database_url: str | None):
+    """Настраивает окружение до создания приложения: create_app читает настройки базы из окружения."""
+    os.environ['SQLALCHEMY_DATABASE_URL'] = database_url or os.environ.get('SQLALCHEMY_DATABASE_URL',
+                                                                           DEFAULT_DATABASE_URL)
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('DB_ECHO', 'false')
+    # Все запросы прогона идут с одного адреса: лимиты логина не должны мерить сами себя
+    for name in ('LOGIN_IP_PER_MINUTE', 'LOGIN_USERNAME_PER_MINUTE', 'LOGIN_IP_BURST', 'LOGIN_USERNAME_BURST'):
+        os.environ.setdefault(name, '1000000')
+    return os.environ['SQLALCHEMY_DATABASE_URL']
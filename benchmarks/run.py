@@ -0,0 +1,194 @@
+"""Нагрузочный прогон роутеров API и веба in-process через ASGI-клиент.
+
+    python -m benchmarks.seed --users 100 --tasks 100000
+    python -m benchmarks.run --requests 500 --concurrency 20 --output result.json
+    python -m benchmarks.run --baseline result.json --max-regression 0.2
+
+Для каждого эндпоинта выводится пропускная способность и p50/p95/p99 латентности,
+с --output результат сохраняется в JSON. С --baseline результаты сравниваются с
+предыдущим прогоном; код выхода 1, если p95 какого-либо эндпоинта вырос больше,
+чем на --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from benchmarks.common import configure, USERNAME_TEMPLATE, PASSWORD
+
+
+def summarize(name: str, latencies: list[float], errors: int, wall: float) -> dict:
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = quantiles[49], quantiles[94], quantiles[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        'endpoint': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(p50 * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'p99_ms': round(p99 * 1000, 3),
+    }
+
+
+async def measure(name: str, make_request, requests: int, concurrency: int) -> dict:
+    latencies, errors, counter = [], 0, iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, errors, time.perf_counter() - start)
+
+
+def task_payload(i: int) -> dict:
+    return {'title': f'Нагрузочная задача {i}', 'status': 'В планах', 'description': 'benchmark ' * (i % 50),
+            'plan_date': (date.today() + timedelta(days=1 + i % 30)).strftime('%d.%m.%Y')}
+
+
+async def run(users: int, requests: int, concurrency: int) -> list[dict]:
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        usernames = [USERNAME_TEMPLATE.format(i) for i in range(users)]
+        headers = []
+        for username in usernames:
+            response = await client.post('/auth/login/', data={'username': username, 'password': PASSWORD})
+            if response.status_code != 200:
+                raise SystemExit(f'Не удалось войти как {username}: сначала запустите python -m benchmarks.seed')
+            headers.append({'Authorization': f"Bearer {response.json()['access_token']}"})
+
+        def auth(i):
+            return headers[i % len(headers)]
+
+        cursors = [(await client.get('/api/tasks/mytasks/', headers=h)).headers.get('x-next-cursor') for h in headers]
+        created: list[tuple[int, int]] = []
+        today = date.today()
+
+        async def login(i):
+            return await client.post('/auth/login/', data={'username': usernames[i % users], 'password': PASSWORD})
+
+        async def mytasks(i):
+            return await client.get('/api/tasks/mytasks/', headers=auth(i))
+
+        async def mytasks_next_page(i):
+            cursor = cursors[i % users]
+            return await client.get('/api/tasks/mytasks/', params={'after': cursor} if cursor else {},
+                                    headers=auth(i))
+
+        async def api_search(i):
+            return await client.get('/api/tasks/mytasks/', params={'query': 'купить'}, headers=auth(i))
+
+        async def create(i):
+            response = await client.post('/api/tasks/create/', json=task_payload(i), headers=auth(i))
+            if response.status_code == 201:
+                created.append((i % users, response.json()['id']))
+            return response
+
+        async def update(i):
+            owner, task_id = created[i % len(created)]
+            return await client.patch(f'/api/tasks/update/{task_id}/', json=task_payload(i), headers=headers[owner])
+
+        async def delete(i):
+            owner, task_id = created[i]
+            return await client.delete(f'/api/tasks/delete/{task_id}/', headers=headers[owner])
+
+        async def web_list(i):
+            return await client.get('/tasks/', headers=auth(i))
+
+        async def web_search(i):
+            params = {'query': 'отчёт', 'status': 'В планах', 'date_from': str(today - timedelta(days=30)),
+                      'date_to': str(today + timedelta(days=90))}
+            return await client.get('/tasks/search/', params=params, headers=auth(i))
+
+        # bcrypt намеренно дорогой, поэтому логинов в 10 раз меньше
+        scenarios = [
+            ('POST /auth/login/', login, max(1, requests // 10)),
+            ('GET /api/tasks/mytasks/', mytasks, requests),
+            ('GET /api/tasks/mytasks/?after=', mytasks_next_page, requests),
+            ('GET /api/tasks/mytasks/?query=', api_search, requests),
+            ('POST /api/tasks/create/', create, requests),
+            ('PATCH /api/tasks/update/{task_id}/', update, requests),
+            ('DELETE /api/tasks/delete/{task_id}/', delete, requests),
+            ('GET /tasks/', web_list, requests),
+            ('GET /tasks/search/', web_search, requests),
+        ]
+        results = []
+        for name, make_request, count in scenarios:
+            if make_request in (update, delete) and not created:
+                # Все создания завершились ошибкой - обновлять и удалять нечего
+                print(f"{name:40} пропущено: ни одной задачи не создано (см. errors у POST /api/tasks/create/)")
+                continue
+            if make_request is delete:
+                count = min(count, len(created))
+            result = await measure(name, make_request, count, concurrency)
+            results.append(result)
+            print(f"{name:40} {result['throughput_rps']:>9.1f} rps  p50 {result['p50_ms']:>8.2f} ms  "
+                  f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}")
+    return results
+
+
+def compare(results: list[dict], baseline: dict, max_regression: float) -> bool:
+    previous = {item['endpoint']: item for item in baseline['results']}
+    ok = True
+    print('\nСравнение с базовым прогоном (p95, пропускная способность):')
+    for result in results:
+        before = previous.get(result['endpoint'])
+        if not before or not before['p95_ms']:
+            continue
+        p95_change = result['p95_ms'] / before['p95_ms'] - 1
+        rps_change = result['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0.0
+        regressed = p95_change > max_regression
+        ok = ok and not regressed
+        print(f"{'REGRESSION' if regressed else 'ok':10} {result['endpoint']:40} "
+              f"p95 {p95_change:+7.1%}  rps {rps_change:+7.1%}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--users', type=int, default=10, help='сколько засеянных пользователей использовать')
+    parser.add_argument('--requests', type=int, default=200, help='запросов на эндпоинт')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--output', help='куда сохранить результат в JSON')
+    parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    database_url = configure(args.database_url)
+    results = asyncio.run(run(args.users, args.requests, args.concurrency))
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': database_url.split(':', 1)[0],
+            'python': platform.python_version(),
+            'users': args.users,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            sys.exit(0 if compare(results, json.load(f), args.max_regression) else 1)
@@ -0,0 +1,90 @@
+"""Генерация синтетических данных для нагрузочных тестов.
+
+    python -m benchmarks.seed --users 100 --tasks 100000 [--database-url URL] [--seed 42]
+
+Создаёт пользователей bench-user-0..N-1 с паролем "benchmark" и M задач между ними.
+Распределения приближены к реальным: задачи по пользователям распределены по Парето
+(есть небольшое число "тяжёлых" пользователей), статусы - 50% в планах, 20% в процессе,
+30% выполнено, plan_date - от года назад до полугода вперёд, длина описания - логнормальная
+до 1000 символов.
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+from datetime import date, timedelta
+from benchmarks.common import configure, USERNAME_TEMPLATE, PASSWORD
+
+BATCH_SIZE = 5000
+STATUS_WEIGHTS = {'PLANNED': 0.5, 'IN_PROGRESS': 0.2, 'DONE': 0.3}
+WORDS = ['купить', 'позвонить', 'отчёт', 'встреча', 'проект', 'молоко', 'код', 'ревью', 'релиз', 'письмо',
+         'документы', 'оплатить', 'спортзал', 'врач', 'билеты', 'подарок', 'ремонт', 'план', 'задача', 'урок']
+
+
+def random_text(rng: random.Random, max_length: int) -> str:
+    length = min(max_length, int(rng.lognormvariate(4, 1)))
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(WORDS) if rng.random() < 0.7 else
+                     ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))))
+    return ' '.join(words)[:max_length]
+
+
+def task_owners(rng: random.Random, users: int, tasks: int) -> list[int]:
+    weights = [rng.paretovariate(1.2) for _ in range(users)]
+    return rng.choices(range(users), weights=weights, k=tasks)
+
+
+async def seed(users: int, tasks: int, seed_value: int):
+    from sqlalchemy import insert, select
+    from database import Database, use_database
+    from settings import load_database_settings
+    from models import User, ToDo, task_status, create_tables
+    from passwords import pwd_context
+
+    database = use_database(Database(load_database_settings()))
+    engine = database.engine
+    rng = random.Random(seed_value)
+    await create_tables()
+    hash_password = pwd_context.hash(PASSWORD)
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        existing = set((await conn.execute(select(User.username))).scalars().all())
+        new_users = [{'username': USERNAME_TEMPLATE.format(i), 'email': f'bench{i}@example.com',
+                      'hash_password': hash_password}
+                     for i in range(users) if USERNAME_TEMPLATE.format(i) not in existing]
+        if new_users:
+            await conn.execute(insert(User), new_users)
+        user_ids = (await conn.execute(
+            select(User.id).filter(User.username.in_([USERNAME_TEMPLATE.format(i) for i in range(users)]))
+            .order_by(User.id))).scalars().all()
+
+    statuses = [task_status[name] for name in STATUS_WEIGHTS]
+    weights = list(STATUS_WEIGHTS.values())
+    owners = task_owners(rng, len(user_ids), tasks)
+    today = date.today()
+    for offset in range(0, tasks, BATCH_SIZE):
+        rows = [{
+            'title': random_text(rng, 200) or 'задача',
+            'status': rng.choices(statuses, weights)[0],
+            'description': random_text(rng, 1000),
+            'plan_date': today + timedelta(days=rng.randint(-365, 180)),
+            'user_id': user_ids[owner],
+        } for owner in owners[offset:offset + BATCH_SIZE]]
+        async with engine.begin() as conn:
+            await conn.execute(insert(ToDo), rows)
+        print(f'{offset + len(rows)}/{tasks} задач', end='\r')
+    await database.dispose()
+    print(f'\nСоздано пользователей: {len(new_users)}, задач: {tasks} за {time.perf_counter() - start:.1f} с')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+    configure(args.database_url)
+    asyncio.run(seed(args.users, args.tasks, args.seed))
@@ -0,0 +1,98 @@
+"""CPU на задачу при выдаче списка: ORM + response_model против строк + FastJSONResponse.
+
+    python -m benchmarks.serialization --tasks 500 --repeat 50
+
+Задачи читаются из временной базы SQLite в памяти, чтобы мерить только работу Python:
+гидрацию результата и сериализацию ответа. Для каждого пути выводится время CPU
+на задачу (мкс) по этапам. Проверяется, что оба пути дают одинаковый JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, timedelta
+
+
+def per_task_us(seconds: float, tasks: int, repeat: int) -> float:
+    return round(seconds / (tasks * repeat) * 1e6, 3)
+
+
+async def run(tasks: int, repeat: int) -> dict:
+    os.environ['SQLALCHEMY_DATABASE_URL'] = 'sqlite+aiosqlite:///:memory:'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from pydantic import TypeAdapter
+    from sqlalchemy import insert, select
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from models import Base, User, ToDo, task_status
+    from shemas import ToDoResponse
+    from task_queries import TASK_LIST_COLUMNS
+    from json_response import dumps, task_list_payload, orjson
+
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [{'id': 1, 'username': 'bench', 'email': 'bench@example.com',
+                                           'hash_password': '-'}])
+        statuses = list(task_status)
+        await conn.execute(insert(ToDo), [
+            {'title': f'Задача {i}', 'status': statuses[i % len(statuses)], 'description': 'д' * 1000,
+             'plan_date': date.today() + timedelta(days=i % 365), 'user_id': 1}
+            for i in range(tasks)
+        ])
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    adapter = TypeAdapter(list[ToDoResponse])
+
+    def orm_serialize(objects) -> bytes:
+        # То же, что FastAPI делает с response_model: валидация from_attributes, dump в JSON-режиме, json.dumps
+        content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode='json')
+        return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode()
+
+    paths = {
+        'orm+response_model': (select(ToDo).filter(ToDo.user_id == 1), lambda result: result.scalars().all(),
+                               orm_serialize),
+        'rows+fast_json': (select(*TASK_LIST_COLUMNS).filter(ToDo.user_id == 1), lambda result: result.all(),
+                           lambda rows: dumps(task_list_payload(rows))),
+    }
+    report, bodies = {}, {}
+    for name, (stmt, fetch, serialize) in paths.items():
+        load_time = serialize_time = 0.0
+        for _ in range(repeat):
+            async with sessions() as db:
+                start = time.process_time()
+                items = fetch(await db.execute(stmt))
+                load_time += time.process_time() - start
+                start = time.process_time()
+                bodies[name] = serialize(items)
+                serialize_time += time.process_time() - start
+        report[name] = {
+            'load_us_per_task': per_task_us(load_time, tasks, repeat),
+            'serialize_us_per_task': per_task_us(serialize_time, tasks, repeat),
+            'total_us_per_task': per_task_us(load_time + serialize_time, tasks, repeat),
+        }
+    await engine.dispose()
+
+    same = json.loads(bodies['orm+response_model']) == json.loads(bodies['rows+fast_json'])
+    return {'tasks': tasks, 'repeat': repeat, 'encoder': 'orjson' if orjson else 'json', 'same_output': same,
+            'results': report}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=500, help='задач в одном ответе')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='куда сохранить результат в JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.tasks, args.repeat))
+    for name, result in report['results'].items():
+        print(f"{name:22} load {result['load_us_per_task']:>8.2f} us/task  "
+              f"serialize {result['serialize_us_per_task']:>8.2f} us/task  "
+              f"total {result['total_us_per_task']:>8.2f} us/task")
+    print(f"encoder: {report['encoder']}, одинаковый JSON: {report['same_output']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if not report['same_output']:
+        raise SystemExit(1)
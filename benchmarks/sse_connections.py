@@ -0,0 +1,76 @@
+"""Память на простаивающий поток /tasks/events/ и задержка доставки изменения.
+
+    python -m benchmarks.sse_connections --connections 10000 --users 1000
+
+Открывает --connections потоков stream_task_events (без HTTP-слоя: меряется состояние
+приложения на соединение, буферы сервера сюда не входят), ждёт, пока все отдадут
+начальный sync, и через tracemalloc считает память на соединение. Затем один
+пользователь записывает задачу, и меряется время до прихода upsert в его потоки.
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import date, timedelta
+from benchmarks.common import configure
+
+
+async def run(connections: int, users: int) -> dict:
+    from sqlalchemy import insert
+    from models import create_tables, User, ToDo, task_status
+    from database import async_session
+    from task_stream import stream_task_events
+    from task_versions import bump_tasks_version
+
+    await create_tables()
+    async with async_session() as db:
+        first_id = (await db.execute(insert(User).returning(User.id), [
+            {'username': f'sse-{time.time_ns()}-{i}', 'email': None, 'hash_password': '-'} for i in range(users)
+        ])).scalars().all()
+        await db.commit()
+
+    streams = [stream_task_events(first_id[i % users]) for i in range(connections)]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    await asyncio.gather(*(anext(stream) for stream in streams))
+    connect_time = time.perf_counter() - start
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    user_id = first_id[0]
+    watched = streams[::users][:10]
+    waiting = [asyncio.create_task(anext(stream)) for stream in watched]
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    async with async_session() as db:
+        version = await bump_tasks_version(db, user_id)
+        db.add(ToDo(title='Событие', status=task_status.PLANNED, description='', user_id=user_id, version=version,
+                    plan_date=date.today() + timedelta(days=1)))
+        await db.commit()
+    chunks = await asyncio.gather(*waiting)
+    delivery = time.perf_counter() - start
+
+    for stream in streams:
+        await stream.aclose()
+    return {
+        'connections': connections,
+        'users': users,
+        'connect_seconds': round(connect_time, 3),
+        'bytes_per_connection': round((after - before) / connections),
+        'delivery_ms': round(delivery * 1000, 3),
+        'delivered': sum('event: upsert' in chunk for chunk in chunks),
+        'watched': len(watched),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    print(json.dumps(asyncio.run(run(args.connections, args.users)), ensure_ascii=False, indent=2))
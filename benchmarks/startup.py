@@ -0,0 +1,89 @@
+"""Холодный старт воркера: время импорта приложения и до первого успешного запроса.
+
+    python -m benchmarks.seed --users 10 --tasks 1000
+    python -m benchmarks.startup --runs 5
+
+Каждый прогон - новый процесс Python, как при перезапуске воркера: импорт main, запуск
+lifespan, затем первые запросы пользователя bench-user-0 и те же запросы повторно (тёплое
+состояние для сравнения). Прогоны делаются с прогревом при старте (STARTUP_WARMUP=true)
+и без него, выводятся медианы по прогонам. Разница first - second показывает, сколько
+первый запрос после рестарта платит за ленивую инициализацию.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks.common import configure, USERNAME_TEMPLATE, PASSWORD
+
+REQUESTS = {
+    'mytasks': ('GET', '/api/tasks/mytasks/'),
+    'web_tasks': ('GET', '/tasks/'),
+    'login': ('POST', '/auth/login/'),
+}
+
+
+async def measure_child(started: float) -> dict:
+    """Выполняется в дочернем процессе: ``started`` - момент до импорта приложения."""
+    import httpx
+    from main import app
+    from security import create_access_token
+
+    imported = time.perf_counter()
+    result = {'import_ms': (imported - started) * 1000}
+    username = USERNAME_TEMPLATE.format(0)
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        result['lifespan_ms'] = (ready - imported) * 1000
+        headers = {'Authorization': f"Bearer {create_access_token({'sub': username})}"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench',
+                                     headers=headers) as client:
+            for attempt in ('first', 'second'):
+                for name, (method, path) in REQUESTS.items():
+                    start = time.perf_counter()
+                    if method == 'POST':
+                        response = await client.post(path, data={'username': username, 'password': PASSWORD})
+                    else:
+                        response = await client.get(path)
+                    elapsed = time.perf_counter() - start
+                    if response.status_code != 200:
+                        raise SystemExit(f'{path}: {response.status_code} - сначала запустите benchmarks.seed')
+                    result[f'{name}_{attempt}_ms'] = elapsed * 1000
+                    if attempt == 'first' and name == 'mytasks':
+                        result['start_to_first_response_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def run_child(database_url: str, warmup: bool) -> dict:
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URL=database_url, STARTUP_WARMUP=str(warmup).lower(),
+               SCHEDULER_ENABLED='false')
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child'], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(database_url: str, runs: int) -> dict:
+    report = {}
+    for warmup in (False, True):
+        samples = [run_child(database_url, warmup) for _ in range(runs)]
+        report['warmup' if warmup else 'no_warmup'] = {
+            key: round(statistics.median(sample[key] for sample in samples), 3) for key in samples[0]
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        started = time.perf_counter()
+        print(json.dumps(asyncio.run(measure_child(started))))
+    else:
+        print(json.dumps(run(configure(args.database_url), args.runs), ensure_ascii=False, indent=2))
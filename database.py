@@ -1,20 +1,181 @@
+import asyncio
+import itertools
+import time
+from dataclasses import replace
+from fastapi import Request
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from environs import Env
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from settings import DatabaseSettings
+from task_events import subscribe, unsubscribe
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который дополнительно считает время получения соединения (ожидание свободного
+    или открытие нового)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_time_total += elapsed
+            self.wait_time_max = max(self.wait_time_max, elapsed)
+
+
+def create_engine_from_settings(settings: DatabaseSettings):
+    kwargs = {'echo': settings.echo, 'pool_pre_ping': settings.pool_pre_ping, 'pool_recycle': settings.pool_recycle}
+    if ':memory:' not in settings.url:
+        kwargs.update(poolclass=TimedQueuePool, pool_size=settings.pool_size,
+                      max_overflow=settings.max_overflow, pool_timeout=settings.pool_timeout)
+    # Параметры подключения asyncpg: другие драйверы Postgres их не принимают
+    if settings.drivername == 'postgresql+asyncpg':
+        connect_args = {'prepared_statement_cache_size': settings.prepared_statement_cache_size}
+        if settings.statement_timeout_ms:
+            connect_args['server_settings'] = {'statement_timeout': str(settings.statement_timeout_ms)}
+        kwargs['connect_args'] = connect_args
+    return create_async_engine(settings.url, **kwargs)
 
-env = Env()
-env.read_env()
-SQLALCHEMY_DATABASE_URL = env('SQLALCHEMY_DATABASE_URL')
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
-async_session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 
-async def get_db():
-    db = async_session()
+class ReplicaRouter:
+    """Выбирает, откуда читать: реплика (round robin или наименее загруженная) или основная база.
+
+    После коммита записи задач пользователь на ``pin_seconds`` закрепляется за основной базой,
+    чтобы сразу видеть свои изменения, пока реплика догоняет. Закрепление живёт в памяти воркера.
+    """
+
+    def __init__(self, primary: async_sessionmaker, engines, selection: str = 'round_robin',
+                 pin_seconds: float = 5.0, max_pinned: int = 100000):
+        self.primary = primary
+        self.replicas = [(replica, async_sessionmaker(bind=replica, class_=AsyncSession, expire_on_commit=False))
+                         for replica in engines]
+        self.selection = selection
+        self.pin_seconds = pin_seconds
+        self.max_pinned = max_pinned
+        self._counter = itertools.count()
+        self._pinned: dict[int, float] = {}
+
+    def pin(self, user_id: int, version: int | None = None):
+        now = time.monotonic()
+        if len(self._pinned) >= self.max_pinned:
+            self._pinned = {key: until for key, until in self._pinned.items() if until > now}
+        self._pinned[user_id] = now + self.pin_seconds
+
+    def is_pinned(self, user_id: int) -> bool:
+        until = self._pinned.get(user_id)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            del self._pinned[user_id]
+            return False
+        return True
+
+    def session_for(self, user_id: int) -> AsyncSession:
+        if not self.replicas or self.is_pinned(user_id):
+            return self.primary()
+        if self.selection == 'least_loaded':
+            _, sessions = min(self.replicas, key=lambda item: _checked_out(item[0]))
+        else:
+            _, sessions = self.replicas[next(self._counter) % len(self.replicas)]
+        return sessions()
+
+
+def _checked_out(replica) -> int:
+    pool = replica.pool
+    return pool.checkedout() if isinstance(pool, AsyncAdaptedQueuePool) else 0
+
+
+class Database:
+    """Основная база, реплики и роутер чтения одного приложения.
+
+    Создаётся в create_app по настройкам и закрывается в конце lifespan, поэтому у каждого
+    приложения свои пулы соединений.
+    """
+
+    def __init__(self, settings: DatabaseSettings):
+        self.settings = settings
+        self.engine = create_engine_from_settings(settings)
+        self.sessions = async_sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.replica_engines = [create_engine_from_settings(replace(settings, url=url))
+                                for url in settings.replica_urls]
+        self.router = ReplicaRouter(self.sessions, self.replica_engines, settings.replica_selection,
+                                    settings.read_your_writes_seconds)
+        subscribe(self.router.pin)
+
+    async def dispose(self):
+        unsubscribe(self.router.pin)
+        for db_engine in (self.engine, *self.replica_engines):
+            await db_engine.dispose()
+
+
+_current: Database | None = None
+
+
+def use_database(database: Database) -> Database:
+    """Делает базу текущей для кода вне запросов: планировщика, архиватора, потоков SSE, скриптов."""
+    global _current
+    _current = database
+    return database
+
+
+def current_database() -> Database:
+    if _current is None:
+        raise RuntimeError('База не подключена: приложение создаётся через main.create_app()')
+    return _current
+
+
+def async_session() -> AsyncSession:
+    return current_database().sessions()
+
+
+def pool_stats(db_engine) -> dict:
+    pool = db_engine.pool
+    stats = {}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                     overflow=pool.overflow())
+    if isinstance(pool, TimedQueuePool):
+        stats.update(wait_count=pool.wait_count, wait_time_total=pool.wait_time_total,
+                     wait_time_max=pool.wait_time_max)
+    return stats
+
+
+async def warm_up_pool(db_engine, connections: int) -> int:
+    """Открывает соединения пула до первого запроса, чтобы подключение к базе не ждал пользователь.
+
+    Соединения открываются одновременно и возвращаются в пул; больше pool_size не открывается -
+    лишние пул всё равно закрыл бы при возврате.
+    """
+    pool = db_engine.pool
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        connections = min(connections, pool.size())
+    else:
+        # Пулы без хранения соединений (":memory:") - достаточно проверить подключение
+        connections = min(connections, 1)
+    opened = await asyncio.gather(*(db_engine.connect() for _ in range(connections)))
+    try:
+        await asyncio.gather(*(connection.exec_driver_sql('SELECT 1') for connection in opened))
+    finally:
+        for connection in opened:
+            await connection.close()
+    return len(opened)
+
+
+async def get_db(request: Request):
+    db = request.app.state.database.sessions()
     try:
         yield db
     finally:
-        await db.close()
\ No newline at end of file
+        await db.close()
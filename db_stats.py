@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Текстов запросов, которые хранит один контекст: остальные только считаются
+MAX_KEPT_STATEMENTS = 1000
+
+
+class QueryStats:
+    """Число SQL-запросов и суммарное время в БД в рамках одного контекста (запроса).
+
+    Тексты запросов собираются только по просьбе (для сообщения max_queries): контекст
+    middleware метрик живёт, пока открыт ответ, и у потока SSE это часы.
+    """
+    __slots__ = ('count', 'duration', 'statements')
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: list[str] | None = [] if keep_statements else None
+
+
+# Вложенные count_queries (например, проверка бюджета поверх middleware метрик) считают независимо
+_active_stats: ContextVar[tuple[QueryStats, ...]] = ContextVar('query_stats', default=())
+
+
+@contextmanager
+def count_queries(keep_statements: bool = False):
+    stats = QueryStats(keep_statements)
+    token = _active_stats.set(_active_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+@contextmanager
+def max_queries(limit: int):
+    """Падает с AssertionError, если внутри блока выполнено больше ``limit`` SQL-запросов."""
+    with count_queries(keep_statements=True) as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(
+            f"Ожидалось не больше {limit} запросов, выполнено {stats.count}:\n" + "\n".join(stats.statements)
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_stats.get():
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active_stats.get()
+    if not active:
+        return
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    for stats in active:
+        stats.count += 1
+        stats.duration += elapsed
+        if stats.statements is not None and len(stats.statements) < MAX_KEPT_STATEMENTS:
+            stats.statements.append(statement)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start_time'):
+        conn.info['query_start_time'].pop()
+
+
+def instrument(db_engine):
+    """Подключает подсчёт запросов к engine; реплики считаются в тот же бюджет и те же метрики запроса."""
+    event.listen(db_engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db_engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(db_engine.sync_engine, 'handle_error', _handle_error)
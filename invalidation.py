@@ -0,0 +1,208 @@
+import asyncio
+import json
+import uuid
+from collections.abc import Callable
+from sqlalchemy import event, select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from settings import env, DatabaseSettings
+
+# auto - Postgres LISTEN/NOTIFY, если основная база Postgres, иначе доставка только внутри процесса
+INVALIDATION_BACKEND = env.str('INVALIDATION_BACKEND', 'auto')
+INVALIDATION_CHANNEL = env.str('INVALIDATION_CHANNEL', 'cache_invalidation')
+# Событий в одном NOTIFY: полезная нагрузка Postgres ограничена 8000 байт
+EVENTS_PER_MESSAGE = 100
+KEEPALIVE_SECONDS = 30
+
+
+class InvalidationBus:
+    """Шина инвалидации кэшей между воркерами.
+
+    Запись публикует событие (вид + аргументы) в свою сессию; после коммита оно доставляется
+    подписчикам этого воркера и через транспорт - остальным воркерам. При откате события
+    отбрасываются. Свои же сообщения, вернувшиеся через транспорт, воркер пропускает.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: dict[str, list[Callable]] = {}
+        self._reset_handlers: list[Callable[[], None]] = []
+        self.sent = 0
+        self.received = 0
+        self.resets = 0
+        transport.attach(self)
+
+    def on(self, kind: str):
+        def decorator(handler):
+            self._handlers.setdefault(kind, []).append(handler)
+            return handler
+        return decorator
+
+    def off(self, kind: str, handler):
+        handlers = self._handlers.get(kind, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def use(self, transport):
+        """Подключает транспорт; до create_app шина доставляет события только внутри процесса."""
+        self.transport = transport
+        transport.attach(self)
+
+    def on_reset(self, handler: Callable[[], None]):
+        """Вызывается, когда сообщения могли потеряться (переподключение слушателя): кэш нужно сбросить целиком."""
+        self._reset_handlers.append(handler)
+        return handler
+
+    def publish(self, db, kind: str, *args):
+        db.info.setdefault('invalidation_events', []).append([kind, *args])
+
+    def dispatch(self, events):
+        for kind, *args in events:
+            for handler in self._handlers.get(kind, ()):
+                handler(*args)
+
+    def receive(self, payload: str):
+        message = json.loads(payload)
+        if message['worker'] == self.worker_id:
+            return
+        self.received += 1
+        self.dispatch(message['events'])
+
+    def reset(self):
+        self.resets += 1
+        for handler in self._reset_handlers:
+            handler()
+
+    def payloads(self, events) -> list[str]:
+        return [json.dumps({'worker': self.worker_id, 'events': events[i:i + EVENTS_PER_MESSAGE]})
+                for i in range(0, len(events), EVENTS_PER_MESSAGE)]
+
+    async def start(self):
+        await self.transport.start()
+
+    async def stop(self):
+        await self.transport.stop()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "received": self.received, "resets": self.resets}
+
+
+class MemoryTransport:
+    """Доставка между шинами одного процесса - замена LISTEN/NOTIFY для SQLite и проверок.
+
+    Несколько шин на общем ``hub`` ведут себя как отдельные воркеры.
+    """
+
+    def __init__(self, hub: list | None = None):
+        self.hub = hub if hub is not None else []
+
+    def attach(self, bus: InvalidationBus):
+        self.bus = bus
+        self.hub.append(bus)
+
+    def before_commit(self, session, payloads: list[str]):
+        pass
+
+    def after_commit(self, payloads: list[str]):
+        for other in self.hub:
+            if other is not self.bus:
+                for payload in payloads:
+                    other.receive(payload)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class PostgresTransport:
+    """NOTIFY уходит в той же транзакции, что и запись, поэтому другие воркеры получают его
+    только после коммита. Каждый воркер держит одно соединение asyncpg с LISTEN."""
+
+    def __init__(self, url: str, channel: str = INVALIDATION_CHANNEL):
+        self.dsn = make_url(url).set(drivername='postgresql').render_as_string(hide_password=False)
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+
+    def attach(self, bus: InvalidationBus):
+        self.bus = bus
+
+    def before_commit(self, session, payloads: list[str]):
+        for payload in payloads:
+            session.execute(select(func.pg_notify(self.channel, payload)))
+
+    def after_commit(self, payloads: list[str]):
+        pass
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self):
+        import asyncpg
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda conn: lost.set())
+                await connection.add_listener(self.channel, lambda conn, pid, channel, payload: self.bus.receive(payload))
+                # Пока слушателя не было, сообщения могли потеряться
+                self.bus.reset()
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        await connection.execute('SELECT 1')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(1)
+
+
+def create_transport(settings: DatabaseSettings, backend: str = INVALIDATION_BACKEND):
+    # LISTEN держит отдельное соединение asyncpg, поэтому auto включает его только с этим драйвером
+    if backend == 'postgres' or (backend == 'auto' and settings.drivername == 'postgresql+asyncpg'):
+        return PostgresTransport(settings.url)
+    return MemoryTransport()
+
+
+bus = InvalidationBus(MemoryTransport())
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify(session):
+    events = session.info.get('invalidation_events')
+    if events:
+        bus.transport.before_commit(session, bus.payloads(events))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch(session):
+    events = session.info.pop('invalidation_events', None)
+    if not events:
+        return
+    bus.sent += 1
+    bus.dispatch(events)
+    bus.transport.after_commit(bus.payloads(events))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('invalidation_events', None)
@@ -0,0 +1,38 @@
+import json
+from datetime import date
+from enum import Enum
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(content) -> bytes:
+    """JSON в UTF-8 без пробелов, как у JSONResponse; orjson, если он установлен."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_default).encode()
+
+
+class FastJSONResponse(Response):
+    """Ответ для готовых dict/list: без jsonable_encoder и валидации response_model."""
+    media_type = 'application/json'
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def task_list_payload(rows) -> list[dict]:
+    # Те же поля, что в ToDoResponse
+    return [{'title': row.title, 'created': row.created, 'status': row.status, 'description': row.description}
+            for row in rows]
@@ -1,36 +1,81 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.templating import Jinja2Templates
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from api_service.api_routers.todo import router as router_todo
 from api_service.api_routers.auth import router as auth_api
 from web_service.web_routers.auth import web_router as auth_web
 from web_service.web_routers.web_todo import router as router_web
+from metrics import MetricsMiddleware, registry
+from templating import templates, precompile
+from scheduler import scheduler, SCHEDULER_ENABLED
+from invalidation import bus, create_transport
+from warmup import warm_up, STARTUP_WARMUP
+from database import Database, use_database
+from db_stats import instrument
+from settings import DatabaseSettings, load_database_settings
+from passwords import password_hasher
 
-app = FastAPI()
-templates = Jinja2Templates(directory='html')
-app.include_router(router_todo)
-app.include_router(auth_api)
-app.include_router(router_web)
-app.include_router(auth_web)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Воркер принимает запросы уже с открытыми соединениями, скомпилированными шаблонами и запросами
+    if STARTUP_WARMUP:
+        await warm_up(app.state.database)
+    else:
+        precompile()
+    await bus.start()
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    await bus.stop()
+    password_hasher.shutdown()
+    await app.state.database.dispose()
 
 
-@app.get('/')
 async def root(request: Request):
-    return templates.TemplateResponse("/index.html", {"request": request})
+    return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.exception_handler(401)
-async def not_found_exception_handler(request: Request, exc):
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
+
+async def unauthorized_exception_handler(request: Request, exc):
     return templates.TemplateResponse(
-        "/401.html",
+        "401.html",
         {"request": request},
         status_code=401
     )
 
 
-@app.exception_handler(404)
 async def not_found_exception_handler(request: Request, exc):
     return templates.TemplateResponse(
-        "/404.html",
+        "404.html",
         {"request": request},
         status_code=404
-    )
\ No newline at end of file
+    )
+
+
+def create_app(settings: DatabaseSettings | None = None) -> FastAPI:
+    """Приложение со своими пулами соединений; настройки базы по умолчанию читаются из окружения."""
+    settings = settings or load_database_settings()
+    database = use_database(Database(settings))
+    for db_engine in (database.engine, *database.replica_engines):
+        instrument(db_engine)
+    bus.use(create_transport(settings))
+    app = FastAPI(lifespan=lifespan)
+    app.state.database = database
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router_todo)
+    app.include_router(auth_api)
+    app.include_router(router_web)
+    app.include_router(auth_web)
+    app.add_api_route('/', root, methods=['GET'])
+    app.add_api_route('/metrics', metrics, methods=['GET'], include_in_schema=False)
+    app.add_exception_handler(401, unauthorized_exception_handler)
+    app.add_exception_handler(404, not_found_exception_handler)
+    return app
+
+
+app = create_app()
@@ -0,0 +1,171 @@
+import time
+from collections.abc import Callable
+from auth_cache import user_cache
+from database import pool_stats, current_database
+from db_stats import count_queries
+from page_cache import page_cache
+from invalidation import bus
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [счётчики по бакетам..., сумма, количество]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, *labels, value: float):
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def samples(self):
+        for labels, data in self._values.items():
+            for bound, count in zip(self.buckets, data):
+                yield (self.name + '_bucket',
+                       _format_labels(self.labelnames + ('le',), labels + (bound,)), count)
+            yield self.name + '_bucket', _format_labels(self.labelnames + ('le',), labels + ('+Inf',)), data[-1]
+            yield self.name + '_sum', _format_labels(self.labelnames, labels), data[-2]
+            yield self.name + '_count', _format_labels(self.labelnames, labels), data[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors: list[Callable[[], dict[str, float]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix: str, collect: Callable[[], dict[str, float]]):
+        """Снимает значения gauge в момент выдачи /metrics (статистика пула, кэшей)."""
+        self._collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(f'{name}{labels} {value}' for name, labels, value in metric.samples())
+        for prefix, collect in self._collectors:
+            for key, value in collect().items():
+                lines.append(f'# TYPE {prefix}_{key} gauge')
+                lines.append(f'{prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'http_requests_total', 'HTTP-запросы по маршруту и коду ответа', ('method', 'route', 'status')))
+REQUEST_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ('method', 'route')))
+IN_PROGRESS = registry.register(Gauge(
+    'http_requests_in_progress', 'Запросы в обработке'))
+DB_QUERIES = registry.register(Histogram(
+    'db_queries_per_request', 'Число SQL-запросов на HTTP-запрос', ('method', 'route'),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)))
+DB_TIME = registry.register(Histogram(
+    'db_time_seconds', 'Время в БД на HTTP-запрос', ('method', 'route')))
+
+
+def database_pool_stats() -> dict:
+    database = current_database()
+    stats = {f'pool_{key}': value for key, value in pool_stats(database.engine).items()}
+    for number, replica in enumerate(database.replica_engines):
+        stats.update({f'replica{number}_pool_{key}': value for key, value in pool_stats(replica).items()})
+    return stats
+
+
+registry.register_collector('db', database_pool_stats)
+registry.register_collector('user_cache', user_cache.stats)
+registry.register_collector('page_cache', page_cache.stats)
+registry.register_collector('invalidation', bus.stats)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность, коды ответов, запросы в обработке и время в БД по маршрутам.
+
+    Маршрут берётся из шаблона пути (/api/tasks/update/{task_id}/), а не из фактического URL,
+    чтобы число меток не росло с числом задач.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        IN_PROGRESS.inc()
+        start = time.perf_counter()
+        with count_queries() as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - start
+                IN_PROGRESS.dec()
+                route = scope.get('route')
+                path = route.path if route is not None else 'unmatched'
+                method = scope['method']
+                REQUESTS.inc(method, path, status_code)
+                REQUEST_LATENCY.observe(method, path, value=elapsed)
+                DB_QUERIES.observe(method, path, value=stats.count)
+                DB_TIME.observe(method, path, value=stats.duration)
@@ -1,6 +1,7 @@
 from logging.config import fileConfig
 from sqlalchemy.ext.asyncio import create_async_engine
 from alembic import context
+from settings import env
 from database import Base  # Импортируем Base из ваших моделей
 from models import ToDo, User
 import asyncio
@@ -11,8 +12,22 @@ from models import *  # Импорт всех моделей
 # Настройка для асинхронной работы
 config = context.config
 fileConfig(config.config_file_name) if config.config_file_name else None
+# Та же база, что у приложения; URL из alembic.ini - только запасной вариант
+config.set_main_option('sqlalchemy.url', env.str('SQLALCHEMY_DATABASE_URL', config.get_main_option('sqlalchemy.url')))
 target_metadata = Base.metadata  # Указываем метаданные моделей
 
+
+# Таблицы FTS5 и GIN-индексы todos и todos_archive (вместе с теневыми таблицами FTS5 вроде todos_fts_data)
+SEARCH_OBJECT_PREFIXES = ('todos_fts', 'ix_todos_search', 'todos_archive_fts', 'ix_todos_archive_search')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Объекты полнотекстового поиска создаются вручную (см. models.SEARCH_DDL и ARCHIVE_SEARCH_DDL), автогенерация их не трогает
+    if reflected and compare_to is None and (name == 'search_vector' or name.startswith(SEARCH_OBJECT_PREFIXES)):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Синхронные миграции для офлайн-режима"""
     url = config.get_main_option("sqlalchemy.url")
@@ -20,6 +35,7 @@ def run_migrations_offline():
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
     with context.begin_transaction():
@@ -41,7 +57,8 @@ def do_run_migrations(connection):
         connection=connection,
         target_metadata=target_metadata,
         compare_type=True,
-        compare_server_default=True
+        compare_server_default=True,
+        include_object=include_object
     )
     with context.begin_transaction():
         context.run_migrations()
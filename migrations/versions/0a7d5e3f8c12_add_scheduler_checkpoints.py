@@ -0,0 +1,40 @@
+"""Add scheduler_checkpoints and todos plan_date index
+
+Revision ID: 0a7d5e3f8c12
+Revises: f41c9d2b7a6e
+Create Date: 2026-10-18 16:02:09.448213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7d5e3f8c12'
+down_revision: Union[str, None] = 'f41c9d2b7a6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scheduler_checkpoints',
+    sa.Column('job', sa.String(length=50), nullable=False),
+    sa.Column('plan_date', sa.Date(), nullable=False),
+    sa.Column('last_id', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('job')
+    )
+    # В Postgres строим индекс CONCURRENTLY, чтобы не блокировать запись в todos
+    with op.get_context().autocommit_block():
+        op.create_index('ix_todos_plan_date_id', 'todos', ['plan_date', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_todos_plan_date_id', table_name='todos', postgresql_concurrently=True)
+    op.drop_table('scheduler_checkpoints')
@@ -0,0 +1,103 @@
+"""Add todos_archive for completed tasks moved out of todos
+
+Revision ID: 1b8e6f4c2d95
+Revises: 0a7d5e3f8c12
+Create Date: 2026-10-18 17:40:26.118903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b8e6f4c2d95'
+down_revision: Union[str, None] = '0a7d5e3f8c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = 'id, title, status, description, created, plan_date, user_id, version'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('todos_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('status', postgresql.ENUM('DONE', 'IN_PROGRESS', 'PLANNED', name='task_status', create_type=False),
+              nullable=False),
+    sa.Column('description', sa.String(length=1000), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('plan_date', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('archived', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_todos_archive_user_id_plan_date_id', 'todos_archive', ['user_id', 'plan_date', 'id'],
+                    unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            ALTER TABLE todos_archive ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED
+        """)
+        op.execute("CREATE INDEX ix_todos_archive_search_vector ON todos_archive USING gin (search_vector)")
+        # Функция todo_stats_apply из f41c9d2b7a6e читает только NEW/OLD, её хватает и для архива
+        op.execute("""
+            CREATE TRIGGER todo_stats_archive_ai AFTER INSERT ON todos_archive
+                FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_archive_ad AFTER DELETE ON todos_archive
+                FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()
+        """)
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE todos_archive_fts USING fts5(
+                title, description, content='todos_archive', content_rowid='id', tokenize='unicode61')
+        """)
+        op.execute("""
+            CREATE TRIGGER todos_archive_fts_ai AFTER INSERT ON todos_archive BEGIN
+                INSERT INTO todos_archive_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todos_archive_fts_ad AFTER DELETE ON todos_archive BEGIN
+                INSERT INTO todos_archive_fts(todos_archive_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_archive_ai AFTER INSERT ON todos_archive BEGIN
+                INSERT INTO todo_stats (user_id, status, plan_date, task_count)
+                VALUES (new.user_id, new.status, new.plan_date, 1)
+                ON CONFLICT (user_id, status, plan_date) DO UPDATE SET task_count = task_count + 1;
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_archive_ad AFTER DELETE ON todos_archive BEGIN
+                UPDATE todo_stats SET task_count = task_count - 1
+                WHERE user_id = old.user_id AND status = old.status AND plan_date = old.plan_date;
+            END
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Архивные задачи возвращаются в todos; триггеры счётчиков ещё на месте, поэтому todo_stats не меняется
+    op.execute(f"INSERT INTO todos ({COLUMNS}) SELECT {COLUMNS} FROM todos_archive")
+    op.execute("DELETE FROM todos_archive")
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for trigger in ('todo_stats_archive_ad', 'todo_stats_archive_ai'):
+        op.execute(f"DROP TRIGGER {trigger} ON todos_archive" if postgres else f"DROP TRIGGER {trigger}")
+    if postgres:
+        op.drop_index('ix_todos_archive_search_vector', table_name='todos_archive')
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER todos_archive_fts_ad")
+        op.execute("DROP TRIGGER todos_archive_fts_ai")
+        op.execute("DROP TABLE todos_archive_fts")
+    op.drop_index('ix_todos_archive_user_id_plan_date_id', table_name='todos_archive')
+    op.drop_table('todos_archive')
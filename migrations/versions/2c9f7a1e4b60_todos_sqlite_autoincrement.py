@@ -0,0 +1,56 @@
+"""Never reuse todos ids on SQLite (AUTOINCREMENT)
+
+Revision ID: 2c9f7a1e4b60
+Revises: 1b8e6f4c2d95
+Create Date: 2026-10-18 20:05:12.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c9f7a1e4b60'
+down_revision: Union[str, None] = '1b8e6f4c2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild_todos(autoincrement: bool) -> None:
+    # SQLite меняет AUTOINCREMENT только пересозданием таблицы, а вместе со старой таблицей
+    # удаляются её триггеры (FTS5 и todo_stats) - их текст сохраняется и выполняется заново
+    bind = op.get_bind()
+    triggers = bind.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'todos'").scalars().all()
+    with op.batch_alter_table('todos', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}) as batch_op:
+        pass
+    for trigger in triggers:
+        op.execute(trigger)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Postgres берёт id из последовательности и не повторяет их; в SQLite без AUTOINCREMENT
+    # новая задача получает max(id) + 1 и может занять id задачи, ушедшей в архив или удалённой
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild_todos(autoincrement=True)
+    # Счётчик должен пропустить и id, которые сейчас есть только в архиве и надгробиях
+    op.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'todos', 0 "
+               "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'todos')")
+    op.execute("""
+        UPDATE sqlite_sequence SET seq = MAX(seq,
+            COALESCE((SELECT MAX(id) FROM todos), 0),
+            COALESCE((SELECT MAX(id) FROM todos_archive), 0),
+            COALESCE((SELECT MAX(todo_id) FROM todo_tombstones), 0))
+        WHERE name = 'todos'
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild_todos(autoincrement=False)
@@ -0,0 +1,33 @@
+"""Add todos_archive (user_id, version) index for sync
+
+Revision ID: 3e5a8d0b7c14
+Revises: 2c9f7a1e4b60
+Create Date: 2026-10-18 21:12:40.553018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e5a8d0b7c14'
+down_revision: Union[str, None] = '2c9f7a1e4b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # В Postgres строим индекс CONCURRENTLY, чтобы не блокировать перенос в архив
+    with op.get_context().autocommit_block():
+        op.create_index('ix_todos_archive_user_id_version', 'todos_archive', ['user_id', 'version'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_todos_archive_user_id_version', table_name='todos_archive',
+                      postgresql_concurrently=True)
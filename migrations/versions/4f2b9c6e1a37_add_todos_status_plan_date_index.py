@@ -0,0 +1,32 @@
+"""Add todos (status, plan_date, id) index for the archiver
+
+Revision ID: 4f2b9c6e1a37
+Revises: 3e5a8d0b7c14
+Create Date: 2026-10-18 22:41:09.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2b9c6e1a37'
+down_revision: Union[str, None] = '3e5a8d0b7c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # В Postgres строим индекс CONCURRENTLY, чтобы не блокировать запись в todos
+    with op.get_context().autocommit_block():
+        op.create_index('ix_todos_status_plan_date_id', 'todos', ['status', 'plan_date', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_todos_status_plan_date_id', table_name='todos', postgresql_concurrently=True)
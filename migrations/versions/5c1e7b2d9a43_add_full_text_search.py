@@ -0,0 +1,64 @@
+"""Add full-text search over todos title and description
+
+Revision ID: 5c1e7b2d9a43
+Revises: 76088dfee792
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7b2d9a43'
+down_revision: Union[str, None] = '76088dfee792'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            ALTER TABLE todos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED
+        """)
+        op.execute("CREATE INDEX ix_todos_search_vector ON todos USING gin (search_vector)")
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE todos_fts USING fts5(
+                title, description, content='todos', content_rowid='id', tokenize='unicode61')
+        """)
+        op.execute("""
+            CREATE TRIGGER todos_fts_ai AFTER INSERT ON todos BEGIN
+                INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todos_fts_ad AFTER DELETE ON todos BEGIN
+                INSERT INTO todos_fts(todos_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN
+                INSERT INTO todos_fts(todos_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+                INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+            END
+        """)
+        op.execute("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_todos_search_vector', table_name='todos')
+        op.drop_column('todos', 'search_vector')
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER todos_fts_au")
+        op.execute("DROP TRIGGER todos_fts_ad")
+        op.execute("DROP TRIGGER todos_fts_ai")
+        op.execute("DROP TABLE todos_fts")
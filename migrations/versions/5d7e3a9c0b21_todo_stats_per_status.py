@@ -0,0 +1,111 @@
+"""Keep todo_stats per status instead of per status and plan date
+
+Revision ID: 5d7e3a9c0b21
+Revises: 4f2b9c6e1a37
+Create Date: 2026-10-18 23:26:51.774930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7e3a9c0b21'
+down_revision: Union[str, None] = '4f2b9c6e1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGERS = {
+    'todo_stats_ai': 'todos',
+    'todo_stats_ad': 'todos',
+    'todo_stats_au': 'todos',
+    'todo_stats_archive_ai': 'todos_archive',
+    'todo_stats_archive_ad': 'todos_archive',
+}
+
+
+def _create_triggers(key: list[str]) -> None:
+    """Триггеры счётчиков по ключу ``key``: ['status'] или ['status', 'plan_date'] (до этой ревизии)."""
+    columns = ', '.join(['user_id'] + key)
+    match_old = ' AND '.join(f'{name} = OLD.{name}' for name in ['user_id'] + key)
+    values_new = ', '.join(f'NEW.{name}' for name in ['user_id'] + key)
+    changed = ' OR '.join(f'OLD.{name} IS DISTINCT FROM NEW.{name}' for name in ['user_id'] + key)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION todo_stats_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE todo_stats SET task_count = task_count - 1 WHERE {match_old};
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO todo_stats ({columns}, task_count) VALUES ({values_new}, 1)
+                    ON CONFLICT ({columns}) DO UPDATE SET task_count = todo_stats.task_count + 1;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        for trigger, table in TRIGGERS.items():
+            action = {'ai': 'INSERT', 'ad': 'DELETE', 'au': f'UPDATE OF {columns}'}[trigger[-2:]]
+            condition = f'WHEN ({changed}) ' if trigger.endswith('_au') else ''
+            op.execute(f"CREATE TRIGGER {trigger} AFTER {action} ON {table} "
+                       f"FOR EACH ROW {condition}EXECUTE FUNCTION todo_stats_apply()")
+        return
+    # В SQLite нет функций-триггеров: тело у каждого триггера своё
+    decrement = f"UPDATE todo_stats SET task_count = task_count - 1 WHERE {match_old.replace('OLD.', 'old.')};"
+    increment = (f"INSERT INTO todo_stats ({columns}, task_count) VALUES ({values_new.replace('NEW.', 'new.')}, 1) "
+                 f"ON CONFLICT ({columns}) DO UPDATE SET task_count = task_count + 1;")
+    changed = changed.replace('IS DISTINCT FROM', 'IS NOT').replace('OLD.', 'old.').replace('NEW.', 'new.')
+    for trigger, table in TRIGGERS.items():
+        if trigger.endswith('_ai'):
+            op.execute(f"CREATE TRIGGER {trigger} AFTER INSERT ON {table} BEGIN {increment} END")
+        elif trigger.endswith('_ad'):
+            op.execute(f"CREATE TRIGGER {trigger} AFTER DELETE ON {table} BEGIN {decrement} END")
+        else:
+            op.execute(f"CREATE TRIGGER {trigger} AFTER UPDATE OF {columns} ON {table} WHEN {changed} "
+                       f"BEGIN {decrement} {increment} END")
+
+
+def _rebuild_stats(key: list[str]) -> None:
+    """Пересоздаёт todo_stats с ключом (user_id, *key) и заполняет её заново по todos и todos_archive.
+
+    Счётчики - производные данные, поэтому таблица не переделывается, а строится с нуля.
+    """
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for trigger, table in TRIGGERS.items():
+        op.execute(f"DROP TRIGGER {trigger} ON {table}" if postgres else f"DROP TRIGGER {trigger}")
+    op.drop_table('todo_stats')
+    key_columns = [sa.Column('status', postgresql.ENUM('DONE', 'IN_PROGRESS', 'PLANNED', name='task_status',
+                                                       create_type=False), nullable=False)]
+    if 'plan_date' in key:
+        key_columns.append(sa.Column('plan_date', sa.Date(), nullable=False))
+    op.create_table('todo_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    *key_columns,
+    sa.Column('task_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', *key)
+    )
+    columns = ', '.join(['user_id'] + key)
+    op.execute(f"""
+        INSERT INTO todo_stats ({columns}, task_count)
+        SELECT {columns}, count(*) FROM (
+            SELECT {columns} FROM todos UNION ALL SELECT {columns} FROM todos_archive
+        ) AS tasks GROUP BY {columns}
+    """)
+    _create_triggers(key)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Строка на каждую дату плана делала сводку O(число дат), а обнулившиеся строки не удалялись;
+    # просроченные задачи теперь считаются запросом по ix_todos_user_id_status_plan_date_id
+    _rebuild_stats(['status'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild_stats(['status', 'plan_date'])
@@ -0,0 +1,35 @@
+"""Tombstone retention: users.purged_version and todo_tombstones.deleted index
+
+Revision ID: 6a4c1e8f3d52
+Revises: 5d7e3a9c0b21
+Create Date: 2026-10-19 00:14:37.905126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a4c1e8f3d52'
+down_revision: Union[str, None] = '5d7e3a9c0b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('purged_version', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_todo_tombstones_deleted', 'todo_tombstones', ['deleted'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        # Базы, созданные ранней версией e6b2c4a9f1d8, получили todo_id SERIAL; todo_id - это id
+        # удалённой задачи, своя последовательность ему не нужна
+        op.execute("ALTER TABLE todo_tombstones ALTER COLUMN todo_id DROP DEFAULT")
+        op.execute("DROP SEQUENCE IF EXISTS todo_tombstones_todo_id_seq")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_tombstones_deleted', table_name='todo_tombstones')
+    op.drop_column('users', 'purged_version')
@@ -0,0 +1,38 @@
+"""Add composite indexes for todos access patterns
+
+Revision ID: 9b4f0c61e2d7
+Revises: 5c1e7b2d9a43
+Create Date: 2026-10-18 11:03:52.870146
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4f0c61e2d7'
+down_revision: Union[str, None] = '5c1e7b2d9a43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_todos_user_id_plan_date_id': ['user_id', 'plan_date', 'id'],
+    'ix_todos_user_id_status_plan_date_id': ['user_id', 'status', 'plan_date', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # В Postgres строим индексы CONCURRENTLY, чтобы не блокировать запись в todos
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(name, 'todos', columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name='todos', postgresql_concurrently=True)
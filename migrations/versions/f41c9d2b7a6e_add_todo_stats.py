@@ -0,0 +1,103 @@
+"""Add todo_stats counters maintained by triggers on todos
+
+Revision ID: f41c9d2b7a6e
+Revises: e6b2c4a9f1d8
+Create Date: 2026-10-18 15:21:44.610382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41c9d2b7a6e'
+down_revision: Union[str, None] = 'e6b2c4a9f1d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('todo_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', postgresql.ENUM('DONE', 'IN_PROGRESS', 'PLANNED', name='task_status', create_type=False),
+              nullable=False),
+    sa.Column('plan_date', sa.Date(), nullable=False),
+    sa.Column('task_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'status', 'plan_date')
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            CREATE FUNCTION todo_stats_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE todo_stats SET task_count = task_count - 1
+                    WHERE user_id = OLD.user_id AND status = OLD.status AND plan_date = OLD.plan_date;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO todo_stats (user_id, status, plan_date, task_count)
+                    VALUES (NEW.user_id, NEW.status, NEW.plan_date, 1)
+                    ON CONFLICT (user_id, status, plan_date) DO UPDATE SET task_count = todo_stats.task_count + 1;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_ai AFTER INSERT ON todos
+                FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_ad AFTER DELETE ON todos
+                FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_au AFTER UPDATE OF user_id, status, plan_date ON todos
+                FOR EACH ROW WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id OR OLD.status IS DISTINCT FROM NEW.status
+                                   OR OLD.plan_date IS DISTINCT FROM NEW.plan_date)
+                EXECUTE FUNCTION todo_stats_apply()
+        """)
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            CREATE TRIGGER todo_stats_ai AFTER INSERT ON todos BEGIN
+                INSERT INTO todo_stats (user_id, status, plan_date, task_count)
+                VALUES (new.user_id, new.status, new.plan_date, 1)
+                ON CONFLICT (user_id, status, plan_date) DO UPDATE SET task_count = task_count + 1;
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_ad AFTER DELETE ON todos BEGIN
+                UPDATE todo_stats SET task_count = task_count - 1
+                WHERE user_id = old.user_id AND status = old.status AND plan_date = old.plan_date;
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER todo_stats_au AFTER UPDATE OF user_id, status, plan_date ON todos
+            WHEN old.user_id IS NOT new.user_id OR old.status IS NOT new.status OR old.plan_date IS NOT new.plan_date
+            BEGIN
+                UPDATE todo_stats SET task_count = task_count - 1
+                WHERE user_id = old.user_id AND status = old.status AND plan_date = old.plan_date;
+                INSERT INTO todo_stats (user_id, status, plan_date, task_count)
+                VALUES (new.user_id, new.status, new.plan_date, 1)
+                ON CONFLICT (user_id, status, plan_date) DO UPDATE SET task_count = task_count + 1;
+            END
+        """)
+    # Начальное заполнение по уже существующим задачам
+    op.execute("""
+        INSERT INTO todo_stats (user_id, status, plan_date, task_count)
+        SELECT user_id, status, plan_date, count(*) FROM todos GROUP BY user_id, status, plan_date
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for trigger in ('todo_stats_au', 'todo_stats_ad', 'todo_stats_ai'):
+        op.execute(f"DROP TRIGGER {trigger} ON todos" if postgres else f"DROP TRIGGER {trigger}")
+    if postgres:
+        op.execute("DROP FUNCTION todo_stats_apply()")
+    op.drop_table('todo_stats')
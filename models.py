@@ -1,7 +1,7 @@
 from datetime import datetime, timezone
-from sqlalchemy import String, ForeignKey, DateTime, func, Date
+from sqlalchemy import String, ForeignKey, DateTime, func, Date, DDL, event, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from database import Base, engine
+from database import Base, current_database
 from enum import Enum
 from sqlalchemy.dialects.postgresql import ENUM
 
@@ -21,6 +21,11 @@ class User(Base):
     username: Mapped[str] = mapped_column(String(50), unique=True, index=True)
     email: Mapped[str] = mapped_column(String(100), unique=True, nullable=True)
     hash_password: Mapped[str] = mapped_column(String(200))
+    # Растёт при каждой записи задач пользователя, из него строится ETag списков
+    tasks_version: Mapped[int] = mapped_column(default=0, server_default='0')
+    # Надгробия с версией до этой включительно удалены по сроку хранения: синхронизация
+    # с более старым токеном не узнает об удалениях и получает 410
+    purged_version: Mapped[int] = mapped_column(default=0, server_default='0')
     todos: Mapped["ToDo"] = relationship('ToDo', back_populates='owner')
 
 
@@ -34,11 +39,214 @@ class ToDo(Base):
     plan_date:  Mapped[Date] = mapped_column(Date)
     # priority: Mapped[]
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    # users.tasks_version на момент последней записи задачи - по нему работает дельта-синхронизация
+    version: Mapped[int] = mapped_column(default=0, server_default='0')
     owner: Mapped[User] = relationship('User', back_populates='todos')
 
+    __table_args__ = (
+        # Списки задач: WHERE user_id = ? ORDER BY plan_date, id (+ keyset и диапазоны дат)
+        Index('ix_todos_user_id_plan_date_id', 'user_id', 'plan_date', 'id'),
+        # Тот же список с фильтром по статусу
+        Index('ix_todos_user_id_status_plan_date_id', 'user_id', 'status', 'plan_date', 'id'),
+        # Изменения после токена синхронизации
+        Index('ix_todos_user_id_version', 'user_id', 'version'),
+        # Планировщик: задачи всех пользователей по дате плана, пачками с чекпоинта
+        Index('ix_todos_plan_date_id', 'plan_date', 'id'),
+        # Архиватор: выполненные задачи всех пользователей по дате плана
+        Index('ix_todos_status_plan_date_id', 'status', 'plan_date', 'id'),
+        # SQLite без AUTOINCREMENT повторно выдаёт id задач, ушедших в архив или удалённых
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ToDoArchive(Base):
+    """Выполненная задача, перенесённая из todos фоновым архиватором (archive.py).
+
+    Колонки те же, что у todos, id сохраняется, поэтому горячие и архивные задачи
+    можно читать одним UNION ALL с общим порядком (plan_date, id). id задач общие
+    с todos: ни последовательность Postgres, ни AUTOINCREMENT в SQLite их не повторяют.
+    """
+    __tablename__ = 'todos_archive'
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(200))
+    status: Mapped[str] = mapped_column(status_enum)
+    description: Mapped[str] = mapped_column(String(1000))
+    created: Mapped[DateTime] = mapped_column(DateTime)
+    plan_date: Mapped[Date] = mapped_column(Date)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    version: Mapped[int] = mapped_column(default=0, server_default='0')
+    archived: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        # В архиве только выполненные задачи, отдельный индекс по статусу не нужен
+        Index('ix_todos_archive_user_id_plan_date_id', 'user_id', 'plan_date', 'id'),
+        # Архив входит в полную и инкрементальную синхронизацию
+        Index('ix_todos_archive_user_id_version', 'user_id', 'version'),
+    )
+
+
+class ToDoTombstone(Base):
+    """Запись об удалённой задаче для дельта-синхронизации, хранится TOMBSTONE_RETENTION_DAYS."""
+    __tablename__ = 'todo_tombstones'
+    # id удалённой задачи, а не свой счётчик
+    todo_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    version: Mapped[int]
+    deleted: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_todo_tombstones_user_id_version', 'user_id', 'version'),
+        # Удаление по сроку хранения
+        Index('ix_todo_tombstones_deleted', 'deleted'),
+    )
+
+
+class ToDoStats(Base):
+    """Число задач пользователя по статусу, его поддерживают триггеры на todos и todos_archive.
+
+    Не больше строки на статус: сводка читает несколько строк независимо от числа задач.
+    """
+    __tablename__ = 'todo_stats'
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    status: Mapped[str] = mapped_column(status_enum, primary_key=True)
+    task_count: Mapped[int] = mapped_column(default=0, server_default='0')
+
+
+class SchedulerCheckpoint(Base):
+    """Докуда задание планировщика обработало задачи в порядке (plan_date, id)."""
+    __tablename__ = 'scheduler_checkpoints'
+    job: Mapped[str] = mapped_column(String(50), primary_key=True)
+    plan_date: Mapped[Date] = mapped_column(Date)
+    last_id: Mapped[int] = mapped_column(default=0, server_default='0')
+    updated: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+SEARCH_CONFIG = 'russian'
+
+# Полнотекстовый поиск живёт вне ORM-модели: в Postgres это сгенерированная колонка
+# search_vector с GIN-индексом, в SQLite - внешняя таблица FTS5 с триггерами синхронизации.
+# Те же объекты создаёт миграция 5c1e7b2d9a43.
+SEARCH_DDL = {
+    'postgresql': [
+        f"""ALTER TABLE todos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            to_tsvector('{SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED""",
+        "CREATE INDEX ix_todos_search_vector ON todos USING gin (search_vector)",
+    ],
+    'sqlite': [
+        """CREATE VIRTUAL TABLE todos_fts USING fts5(
+            title, description, content='todos', content_rowid='id', tokenize='unicode61')""",
+        """CREATE TRIGGER todos_fts_ai AFTER INSERT ON todos BEGIN
+            INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER todos_fts_ad AFTER DELETE ON todos BEGIN
+            INSERT INTO todos_fts(todos_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        """CREATE TRIGGER todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN
+            INSERT INTO todos_fts(todos_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+    ],
+}
+
+# Архив ищется так же, как todos; строки в нём не меняются, поэтому в SQLite хватает
+# триггеров на вставку и удаление. Те же объекты создаёт миграция 1b8e6f4c2d95.
+ARCHIVE_SEARCH_DDL = {
+    'postgresql': [
+        f"""ALTER TABLE todos_archive ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            to_tsvector('{SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED""",
+        "CREATE INDEX ix_todos_archive_search_vector ON todos_archive USING gin (search_vector)",
+    ],
+    'sqlite': [
+        """CREATE VIRTUAL TABLE todos_archive_fts USING fts5(
+            title, description, content='todos_archive', content_rowid='id', tokenize='unicode61')""",
+        """CREATE TRIGGER todos_archive_fts_ai AFTER INSERT ON todos_archive BEGIN
+            INSERT INTO todos_archive_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER todos_archive_fts_ad AFTER DELETE ON todos_archive BEGIN
+            INSERT INTO todos_archive_fts(todos_archive_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END""",
+    ],
+}
+
+for table, ddl in ((ToDo.__table__, SEARCH_DDL), (ToDoArchive.__table__, ARCHIVE_SEARCH_DDL)):
+    for dialect, statements in ddl.items():
+        for statement in statements:
+            event.listen(table, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+
+# Счётчики todo_stats обновляются триггерами в той же транзакции, что и запись задачи, поэтому
+# их не обходят ни пакетные операции, ни COPY при импорте. Архивные задачи тоже считаются: перенос
+# в todos_archive - это -1 на todos и +1 на архиве. В нынешнем виде те же объекты создаёт миграция 5d7e3a9c0b21.
+STATS_DDL = {
+    'postgresql': [
+        """CREATE FUNCTION todo_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE todo_stats SET task_count = task_count - 1
+                WHERE user_id = OLD.user_id AND status = OLD.status;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO todo_stats (user_id, status, task_count)
+                VALUES (NEW.user_id, NEW.status, 1)
+                ON CONFLICT (user_id, status) DO UPDATE SET task_count = todo_stats.task_count + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql""",
+        """CREATE TRIGGER todo_stats_ai AFTER INSERT ON todos
+            FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()""",
+        """CREATE TRIGGER todo_stats_ad AFTER DELETE ON todos
+            FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()""",
+        """CREATE TRIGGER todo_stats_au AFTER UPDATE OF user_id, status ON todos
+            FOR EACH ROW WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id OR OLD.status IS DISTINCT FROM NEW.status)
+            EXECUTE FUNCTION todo_stats_apply()""",
+        """CREATE TRIGGER todo_stats_archive_ai AFTER INSERT ON todos_archive
+            FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()""",
+        """CREATE TRIGGER todo_stats_archive_ad AFTER DELETE ON todos_archive
+            FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()""",
+    ],
+    'sqlite': [
+        """CREATE TRIGGER todo_stats_ai AFTER INSERT ON todos BEGIN
+            INSERT INTO todo_stats (user_id, status, task_count)
+            VALUES (new.user_id, new.status, 1)
+            ON CONFLICT (user_id, status) DO UPDATE SET task_count = task_count + 1;
+        END""",
+        """CREATE TRIGGER todo_stats_ad AFTER DELETE ON todos BEGIN
+            UPDATE todo_stats SET task_count = task_count - 1
+            WHERE user_id = old.user_id AND status = old.status;
+        END""",
+        """CREATE TRIGGER todo_stats_au AFTER UPDATE OF user_id, status ON todos
+        WHEN old.user_id IS NOT new.user_id OR old.status IS NOT new.status
+        BEGIN
+            UPDATE todo_stats SET task_count = task_count - 1
+            WHERE user_id = old.user_id AND status = old.status;
+            INSERT INTO todo_stats (user_id, status, task_count)
+            VALUES (new.user_id, new.status, 1)
+            ON CONFLICT (user_id, status) DO UPDATE SET task_count = task_count + 1;
+        END""",
+        """CREATE TRIGGER todo_stats_archive_ai AFTER INSERT ON todos_archive BEGIN
+            INSERT INTO todo_stats (user_id, status, task_count)
+            VALUES (new.user_id, new.status, 1)
+            ON CONFLICT (user_id, status) DO UPDATE SET task_count = task_count + 1;
+        END""",
+        """CREATE TRIGGER todo_stats_archive_ad AFTER DELETE ON todos_archive BEGIN
+            UPDATE todo_stats SET task_count = task_count - 1
+            WHERE user_id = old.user_id AND status = old.status;
+        END""",
+    ],
+}
+
+# После создания всех таблиц: триггеры на todos и todos_archive пишут в todo_stats
+for dialect, statements in STATS_DDL.items():
+    for statement in statements:
+        event.listen(Base.metadata, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
 
 async def create_tables():
-    async with engine.begin() as conn:
+    async with current_database().engine.begin() as conn:
         # Создание таблиц
         await conn.run_sync(Base.metadata.create_all)
 
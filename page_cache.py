@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from task_events import subscribe
+from invalidation import bus
+from settings import env
+
+PAGE_CACHE_MAX_BYTES = env.int('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+PAGE_CACHE_MAX_ENTRY_BYTES = env.int('PAGE_CACHE_MAX_ENTRY_BYTES', 1024 * 1024)
+# Записи других воркеров приходят через шину инвалидации; TTL - страховка на случай
+# потерянного сообщения (без Postgres шина работает только внутри процесса)
+PAGE_CACHE_TTL = env.float('PAGE_CACHE_TTL', 300.0)
+
+
+def page_key(query: str | None = None, status: str | None = None, date_from: str | None = None,
+             date_to: str | None = None, limit: int | None = None, after: str | None = None,
+             include_archived: bool = False) -> tuple:
+    """Нормализованные параметры страницы: пустые значения и пробелы по краям не дают разных ключей."""
+    return tuple((value.strip() or None) if isinstance(value, str) else value
+                 for value in (query, status, date_from, date_to, limit, after, include_archived))
+
+
+class PageCache:
+    """LRU-кэш отрендеренных страниц списка задач, ограниченный суммарным размером в байтах.
+
+    Записи пользователя сбрасываются после коммита любой записи его задач (task_events).
+    Поколение пользователя защищает от гонки: страница, начатая до инвалидации, в кэш не попадёт.
+    """
+
+    def __init__(self, max_bytes: int = PAGE_CACHE_MAX_BYTES, max_entry_bytes: int = PAGE_CACHE_MAX_ENTRY_BYTES,
+                 ttl: float = PAGE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self._items: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+        self._user_keys: dict[int, set[tuple]] = {}
+        self._generations: dict[int, int] = {}
+        self._epoch = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: int) -> tuple[int, int]:
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def get(self, user_id: int, key: tuple) -> bytes | None:
+        item = self._items.get((user_id, key))
+        if item is None:
+            self.misses += 1
+            return None
+        expires, body = item
+        if expires < time.monotonic():
+            self._remove((user_id, key))
+            self.misses += 1
+            return None
+        self._items.move_to_end((user_id, key))
+        self.hits += 1
+        return body
+
+    def set(self, user_id: int, key: tuple, body: bytes, generation: tuple[int, int]):
+        if generation != self.generation(user_id) or len(body) > self.max_entry_bytes:
+            return
+        full_key = (user_id, key)
+        self._remove(full_key)
+        self._items[full_key] = (time.monotonic() + self.ttl, body)
+        self._user_keys.setdefault(user_id, set()).add(full_key)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._items)))
+            self.evictions += 1
+
+    async def store_stream(self, user_id: int, key: tuple, generation: tuple[int, int],
+                           chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Отдаёт куски потокового рендера дальше и кладёт страницу в кэш, если она не слишком большая."""
+        parts, size = [], 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > self.max_entry_bytes:
+                parts = None
+            elif parts is not None:
+                parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self.set(user_id, key, b''.join(parts), generation)
+
+    def invalidate_user(self, user_id: int, version: int | None = None):
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        keys = self._user_keys.pop(user_id, ())
+        for full_key in keys:
+            self._remove(full_key)
+        self.invalidations += len(keys)
+
+    def clear(self):
+        self._epoch += 1
+        self._items.clear()
+        self._user_keys.clear()
+        self.size = 0
+
+    def _remove(self, full_key: tuple):
+        item = self._items.pop(full_key, None)
+        if item is None:
+            return
+        self.size -= len(item[1])
+        keys = self._user_keys.get(full_key[0])
+        if keys is not None:
+            keys.discard(full_key)
+            if not keys:
+                del self._user_keys[full_key[0]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "size_bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+page_cache = PageCache()
+subscribe(page_cache.invalidate_user)
+bus.on_reset(page_cache.clear)
@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from metrics import registry
+from rate_limit import too_many_requests, RATE_LIMITED
+from settings import env
+
+PASSWORD_HASH_WORKERS = env.int('PASSWORD_HASH_WORKERS', 2)
+PASSWORD_HASH_QUEUE = env.int('PASSWORD_HASH_QUEUE', 32)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasher:
+    """Выполняет bcrypt в отдельном пуле потоков, не блокируя event loop.
+
+    Одновременно считается не больше ``workers`` хэшей, ещё ``queue_limit`` запросов
+    могут ждать своей очереди - остальные сразу получают 429 с Retry-After.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: ThreadPoolExecutor | None = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self._pending = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Пул создаётся при первом хэше после старта или после shutdown (новый lifespan в том же процессе)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._pending >= self.workers + self.queue_limit:
+            RATE_LIMITED.inc('password_hash')
+            raise too_many_requests(1)
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, password, hashed_password)
+
+    async def warm_up(self):
+        """Загружает backend bcrypt заранее: при первой загрузке passlib прогоняет самопроверки."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._get_executor(), pwd_context.handler().get_backend)
+
+    def shutdown(self):
+        """Останавливает потоки пула в конце lifespan; запросы к этому моменту уже обработаны."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self._pending}
+
+
+password_hasher = PasswordHasher()
+registry.register_collector('password_hasher', password_hasher.stats)
@@ -0,0 +1,188 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Form, HTTPException, Request
+from metrics import registry, Counter
+from settings import env
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+# memory - свои счётчики в каждом воркере, redis - общие для всех воркеров
+RATE_LIMIT_BACKEND = env.str('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_REDIS_URL = env.str('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+RATE_LIMIT_MAX_KEYS = env.int('RATE_LIMIT_MAX_KEYS', 100000)
+# Сколько помнить адрес последнего успешного входа: с него лимит неудач по имени не действует
+LOGIN_TRUSTED_SECONDS = env.int('LOGIN_TRUSTED_SECONDS', 30 * 24 * 3600)
+
+RATE_LIMITED = registry.register(Counter(
+    'rate_limited_total', 'Запросы, отклонённые ограничителем частоты', ('limit',)))
+
+
+@dataclass(frozen=True)
+class Limit:
+    name: str
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60
+
+
+LOGIN_PER_IP = Limit('login_ip', env.float('LOGIN_IP_PER_MINUTE', 30), env.int('LOGIN_IP_BURST', 10))
+# Только неудачные пароли: успешные входы не расходуют лимит имени
+LOGIN_PER_USERNAME = Limit('login_username', env.float('LOGIN_USERNAME_PER_MINUTE', 10),
+                           env.int('LOGIN_USERNAME_BURST', 5))
+REGISTER_PER_IP = Limit('register_ip', env.float('REGISTER_IP_PER_MINUTE', 10), env.int('REGISTER_IP_BURST', 5))
+
+
+class MemoryBackend:
+    """Token bucket в памяти процесса; самые давние ключи вытесняются сверх ``max_keys``."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._values: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int, consume: bool = True) -> float:
+        """Берёт токен; 0, если он был, иначе через сколько секунд токен появится.
+
+        С ``consume=False`` только проверяет, есть ли токен, не расходуя его.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1 if consume else 0
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def remember(self, key: str, value: str, ttl: int):
+        self._values[key] = (value, time.monotonic() + ttl)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_keys:
+            self._values.popitem(last=False)
+
+    async def recall(self, key: str) -> str | None:
+        value, expires = self._values.get(key, (None, 0.0))
+        return value if expires > time.monotonic() else None
+
+
+# Тот же алгоритм атомарно на стороне Redis; время берётся у Redis, чтобы не зависеть от часов воркеров
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local consume = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(data[1]) or burst
+local updated = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - consume
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Общие для всех воркеров token bucket'ы в Redis (нужен пакет redis)."""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        if redis_asyncio is None:
+            raise RuntimeError('RATE_LIMIT_BACKEND=redis требует установленный пакет redis')
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int, consume: bool = True) -> float:
+        try:
+            return float(await self._script(keys=[f'rate_limit:{key}'], args=[rate, burst, int(consume)]))
+        except Exception as e:
+            # Недоступный Redis не должен закрывать вход: пропускаем, bcrypt всё равно ограничен пулом
+            print(e)
+            return 0.0
+
+    async def remember(self, key: str, value: str, ttl: int):
+        try:
+            await self._client.set(f'rate_limit:{key}', value, ex=ttl)
+        except Exception as e:
+            print(e)
+
+    async def recall(self, key: str) -> str | None:
+        try:
+            value = await self._client.get(f'rate_limit:{key}')
+        except Exception as e:
+            print(e)
+            return None
+        return value.decode() if value is not None else None
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == 'redis':
+        return RedisBackend()
+    return MemoryBackend()
+
+
+backend = create_backend()
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Слишком много запросов, попробуйте позже",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def check_limit(limit: Limit, key: str, consume: bool = True):
+    wait = await backend.take(f'{limit.name}:{key}', limit.rate, limit.burst, consume)
+    if wait > 0:
+        RATE_LIMITED.inc(limit.name)
+        raise too_many_requests(wait)
+
+
+def client_ip(request: Request) -> str:
+    # За прокси адрес клиента подставляет uvicorn --proxy-headers
+    return request.client.host if request.client else 'unknown'
+
+
+async def login_rate_limit(request: Request, username: str = Form()):
+    """Зависимость для логина: лимиты по IP и по имени пользователя проверяются до bcrypt.
+
+    Лимит по имени считает только неудачные пароли (login_failed) и здесь лишь проверяется.
+    С адреса, с которого этот пользователь последний раз вошёл, он не действует: подбор
+    пароля с чужих адресов не блокирует вход владельцу.
+    """
+    ip = client_ip(request)
+    await check_limit(LOGIN_PER_IP, ip)
+    if await backend.recall(f'login_ok:{username.lower()}') != ip:
+        await check_limit(LOGIN_PER_USERNAME, username.lower(), consume=False)
+
+
+async def login_failed(username: str):
+    await backend.take(f'{LOGIN_PER_USERNAME.name}:{username.lower()}', LOGIN_PER_USERNAME.rate,
+                       LOGIN_PER_USERNAME.burst)
+
+
+async def login_succeeded(request: Request, username: str):
+    await backend.remember(f'login_ok:{username.lower()}', client_ip(request), LOGIN_TRUSTED_SECONDS)
+
+
+async def register_rate_limit(request: Request):
+    await check_limit(REGISTER_PER_IP, client_ip(request))
@@ -0,0 +1,28 @@
+from database import async_session
+from invalidation import bus
+
+
+async def publish_reminder(job: str, task):
+    """Рассылает напоминание о задаче всем воркерам через шину инвалидации.
+
+    Событие уходит после коммита своей короткой транзакции (в Postgres - NOTIFY), и открытые
+    потоки SSE пользователя в любом воркере получают его событием с именем задания.
+    """
+    async with async_session() as db:
+        bus.publish(db, 'reminder', task.user_id, job, {
+            'id': task.id,
+            'title': task.title,
+            'status': task.status.value,
+            'plan_date': task.plan_date.isoformat(),
+        })
+        await db.commit()
+
+
+async def remind_due(task):
+    # Наступил день плана
+    await publish_reminder('due', task)
+
+
+async def remind_overdue(task):
+    # День плана прошёл, а задача не выполнена
+    await publish_reminder('overdue', task)
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from datetime import date, timedelta
+from sqlalchemy import select, update, tuple_
+from sqlalchemy.exc import IntegrityError
+from database import async_session
+from models import ToDo, SchedulerCheckpoint, task_status
+from metrics import registry, Counter, Histogram
+from archive import archive_done_tasks
+from task_versions import purge_tombstones
+from reminders import remind_due, remind_overdue
+from settings import env
+
+SCHEDULER_ENABLED = env.bool('SCHEDULER_ENABLED', True)
+SCHEDULER_INTERVAL = env.float('SCHEDULER_INTERVAL', 60.0)
+SCHEDULER_BATCH_SIZE = env.int('SCHEDULER_BATCH_SIZE', 500)
+SCHEDULER_CONCURRENCY = env.int('SCHEDULER_CONCURRENCY', 10)
+
+# Задание -> через сколько дней после plan_date невыполненная задача в него попадает
+JOBS = {
+    'due': 0,       # напоминание в день плана
+    'overdue': 1,   # просрочка на следующий день
+}
+DUE_COLUMNS = (ToDo.id, ToDo.user_id, ToDo.title, ToDo.status, ToDo.plan_date)
+
+PROCESSED = registry.register(Counter(
+    'scheduler_tasks_processed_total', 'Задачи, обработанные планировщиком', ('job',)))
+BATCHES = registry.register(Counter(
+    'scheduler_batches_total', 'Пачки планировщика по результату', ('job', 'result')))
+BATCH_DURATION = registry.register(Histogram(
+    'scheduler_batch_duration_seconds', 'Время обработки пачки планировщика', ('job',)))
+HANDLER_ERRORS = registry.register(Counter(
+    'scheduler_handler_errors_total', 'Задачи, на которых обработчик задания упал', ('job',)))
+
+
+class Scheduler:
+    """Фоновые задания по plan_date: задачи читаются пачками по индексу (plan_date, id) с чекпоинта.
+
+    Пачка забирается сдвигом чекпоинта в scheduler_checkpoints: строка берётся FOR UPDATE
+    SKIP LOCKED, а сдвиг делается условным UPDATE по старому значению, так что если задание
+    уже обрабатывает другой воркер, пачка пропускается, и одна и та же работа не выполняется
+    дважды. Обработчики вызываются после коммита сдвига, без блокировки: упавший обработчик
+    не повторяется (не больше одного раза на задачу). Задание без обработчиков не разбирается
+    и чекпоинт не двигает. Задача, которой позже поставили уже пройденную дату плана,
+    в задание не попадёт.
+    """
+
+    def __init__(self, jobs: dict[str, int] = JOBS, interval: float = SCHEDULER_INTERVAL,
+                 batch_size: int = SCHEDULER_BATCH_SIZE, concurrency: int = SCHEDULER_CONCURRENCY):
+        self.jobs = jobs
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._handlers: dict[str, list[Callable[..., Awaitable]]] = {job: [] for job in jobs}
+        self._caught_up = {job: time.monotonic() for job in jobs}
+        self._periodic: list[Callable[[date | None], Awaitable]] = []
+        self._task: asyncio.Task | None = None
+
+    def on(self, job: str):
+        """Регистрирует async-обработчик задачи, пришедшей в задание ``job``."""
+        def decorator(handler):
+            self._handlers[job].append(handler)
+            return handler
+        return decorator
+
+    def every_tick(self, handler: Callable[[date | None], Awaitable]):
+        """Регистрирует async-обслуживание, которое выполняется на каждом проходе после заданий."""
+        self._periodic.append(handler)
+        return handler
+
+    async def ensure_checkpoints(self, today: date | None = None):
+        # Новое задание начинает с текущего дня, а не со всей истории задач
+        today = today or date.today()
+        async with async_session() as db:
+            existing = set((await db.execute(select(SchedulerCheckpoint.job))).scalars())
+            for job, lag_days in self.jobs.items():
+                if job in existing:
+                    continue
+                try:
+                    db.add(SchedulerCheckpoint(job=job, plan_date=today - timedelta(days=lag_days), last_id=0))
+                    await db.commit()
+                except IntegrityError:
+                    # Чекпоинт одновременно создал другой воркер
+                    await db.rollback()
+
+    async def run_batch(self, job: str, today: date | None = None) -> int | None:
+        """Обрабатывает одну пачку; число задач или None, если задание занято другим воркером."""
+        if not self._handlers[job]:
+            return 0
+        target = (today or date.today()) - timedelta(days=self.jobs[job])
+        start = time.perf_counter()
+        async with async_session() as db:
+            result = await db.execute(
+                select(SchedulerCheckpoint.plan_date, SchedulerCheckpoint.last_id)
+                .where(SchedulerCheckpoint.job == job)
+                .with_for_update(skip_locked=True)
+            )
+            checkpoint = result.first()
+            if checkpoint is None:
+                BATCHES.inc(job, 'skipped')
+                return None
+            result = await db.execute(
+                select(*DUE_COLUMNS)
+                .where(tuple_(ToDo.plan_date, ToDo.id) > tuple_(checkpoint.plan_date, checkpoint.last_id),
+                       ToDo.plan_date <= target, ToDo.status != task_status.DONE)
+                .order_by(ToDo.plan_date, ToDo.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                await db.rollback()
+                return 0
+            claimed = await db.execute(
+                update(SchedulerCheckpoint)
+                .where(SchedulerCheckpoint.job == job, SchedulerCheckpoint.plan_date == checkpoint.plan_date,
+                       SchedulerCheckpoint.last_id == checkpoint.last_id)
+                .values(plan_date=rows[-1].plan_date, last_id=rows[-1].id)
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount != 1:
+                await db.rollback()
+                BATCHES.inc(job, 'skipped')
+                return None
+            await db.commit()
+        await self._dispatch(job, rows)
+        PROCESSED.inc(job, amount=len(rows))
+        BATCHES.inc(job, 'processed')
+        BATCH_DURATION.observe(job, value=time.perf_counter() - start)
+        return len(rows)
+
+    async def _dispatch(self, job: str, rows):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def handle(row):
+            async with semaphore:
+                for handler in self._handlers[job]:
+                    try:
+                        await handler(row)
+                    except Exception as e:
+                        # Пачка уже забрана: ошибка одной задачи не должна останавливать остальные
+                        print(e)
+                        HANDLER_ERRORS.inc(job)
+
+        await asyncio.gather(*(handle(row) for row in rows))
+
+    async def run_once(self, today: date | None = None):
+        for job in self.jobs:
+            if not self._handlers[job]:
+                # Задание выключено, а не отстаёт
+                self._caught_up[job] = time.monotonic()
+                continue
+            while True:
+                processed = await self.run_batch(job, today)
+                # None - задание сейчас разбирает другой воркер, для этого воркера оно не отстаёт
+                if processed is None or processed < self.batch_size:
+                    self._caught_up[job] = time.monotonic()
+                    break
+        for handler in self._periodic:
+            await handler(today)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.ensure_checkpoints()
+                await self.run_once()
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        # Отставание: сколько секунд назад задание последний раз разобрало всё, что уже наступило
+        now = time.monotonic()
+        return {f'{job}_lag_seconds': now - caught_up for job, caught_up in self._caught_up.items()}
+
+
+scheduler = Scheduler()
+scheduler.on('due')(remind_due)
+scheduler.on('overdue')(remind_overdue)
+scheduler.every_tick(archive_done_tasks)
+scheduler.every_tick(purge_tombstones)
+registry.register_collector('scheduler', scheduler.stats)
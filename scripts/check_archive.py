@@ -0,0 +1,173 @@
+"""Проверка архивации выполненных задач на временной базе SQLite.
+
+Запуск:
+    python -m scripts.check_archive [--database-url URL]
+
+Пользователь создаёт выполненные задачи на ближайшие дни и более поздние; API не принимает
+прошедшие даты, поэтому архиватор запускается с порогом в будущем и переносит ближние
+в todos_archive. Проверяется, что список и поиск по умолчанию видят только todos,
+с include_archived - обе таблицы одной keyset-пагинацией без пропусков и повторов,
+счётчики todo_stats не меняются, а ETag списка после переноса становится другим.
+Полная синхронизация и экспорт отдают архивные задачи вместе с остальными, а изменить
+и удалить архивную задачу можно так же, как обычную.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+OLD_DONE = 7
+FRESH = 3
+
+
+async def check(database_url: str) -> bool:
+    os.environ['SQLALCHEMY_DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'archive-check')
+    import httpx
+    from sqlalchemy import select, func
+    from main import app
+    from models import create_tables, ToDo, ToDoArchive
+    from database import async_session
+    from archive import archive_batch
+    import task_versions
+
+    await create_tables()
+    sync_max_changes = task_versions.SYNC_MAX_CHANGES
+    username = f'archive-check-{uuid.uuid4().hex[:8]}'
+    cutoff = date.today() + timedelta(days=5)
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://check') as client:
+        await client.post('/auth/register/', json={'username': username, 'email': f'{username}@example.com',
+                                                   'password': username})
+        response = await client.post('/auth/login/', data={'username': username, 'password': username})
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        for i in range(OLD_DONE):
+            await client.post('/api/tasks/create/', json={
+                'title': f'Старая {i}', 'status': 'Выполнено', 'description': 'архивная заметка',
+                'plan_date': (date.today() + timedelta(days=i % 3)).strftime('%d.%m.%Y')})
+        for i in range(FRESH):
+            await client.post('/api/tasks/create/', json={
+                'title': f'Свежая {i}', 'status': 'Выполнено', 'description': 'заметка',
+                'plan_date': (cutoff + timedelta(days=i)).strftime('%d.%m.%Y')})
+
+        stats_before = (await client.get('/api/tasks/stats/')).json()
+        before = await client.get('/api/tasks/mytasks/')
+        # Маленькие пачки: перенос идёт несколькими транзакциями
+        moved = 0
+        while batch := await archive_batch(cutoff, batch_size=3):
+            moved += batch
+        results.append(('перенесены только задачи раньше порога', moved == OLD_DONE))
+
+        async with async_session() as db:
+            hot = (await db.execute(select(func.count()).select_from(ToDo))).scalar_one()
+            archived = (await db.execute(select(func.count()).select_from(ToDoArchive))).scalar_one()
+        results.append(('в todos остались только задачи после порога', hot == FRESH and archived == OLD_DONE))
+
+        response = await client.get('/api/tasks/mytasks/', headers={'If-None-Match': before.headers['ETag']})
+        results.append(('ETag списка изменился после переноса', response.status_code == 200))
+        results.append(('по умолчанию список без архива', len(response.json()) == FRESH))
+
+        seen, after = [], None
+        while True:
+            params = {'include_archived': 'true', 'limit': 4} | ({'after': after} if after else {})
+            response = await client.get('/api/tasks/mytasks/', params=params)
+            seen += [task['title'] for task in response.json()]
+            after = response.headers.get('X-Next-Cursor')
+            if not after:
+                break
+        results.append(('с include_archived все задачи по страницам без повторов',
+                        len(seen) == OLD_DONE + FRESH == len(set(seen))))
+
+        found = (await client.get('/api/tasks/mytasks/', params={'query': 'заметка'})).json()
+        found_all = (await client.get('/api/tasks/mytasks/', params={'query': 'заметка',
+                                                                       'include_archived': 'true'})).json()
+        results.append(('поиск по архиву только с флагом', len(found) == FRESH and len(found_all) == OLD_DONE + FRESH))
+
+        response = await client.get('/tasks/', params={'include_archived': 'true', 'limit': 100})
+        results.append(('веб-список с архивом', response.text.count('Старая') == OLD_DONE))
+
+        results.append(('счётчики статистики не изменились',
+                        (await client.get('/api/tasks/stats/')).json() == stats_before))
+        recomputed = (await client.post('/api/tasks/stats/recompute/')).json()
+        results.append(('пересчёт учитывает архив', recomputed == stats_before))
+
+        # Маленькие страницы: снимок листается по (version, id) сразу по обеим таблицам
+        task_versions.SYNC_MAX_CHANGES = 4
+        synced, after = [], None
+        while True:
+            page = (await client.get('/api/tasks/changes/', params={'after': after} if after else {})).json()
+            synced += [task['id'] for task in page['upserts']]
+            if not (after := page['next_cursor']):
+                break
+        task_versions.SYNC_MAX_CHANGES = sync_max_changes
+        results.append(('полная синхронизация отдаёт и архивные задачи',
+                        len(synced) == OLD_DONE + FRESH == len(set(synced))))
+
+        lines = (await client.get('/api/tasks/export/')).text.splitlines()
+        exported = [(task['plan_date'], task['id']) for task in map(json.loads, lines)]
+        results.append(('экспорт с архивом в порядке (plan_date, id)',
+                        len(exported) == OLD_DONE + FRESH and exported == sorted(exported)))
+
+        async with async_session() as db:
+            archived_ids = sorted((await db.execute(select(ToDoArchive.id))).scalars())
+        token = (await client.get('/api/tasks/changes/')).json()['token']
+        response = await client.patch(f'/api/tasks/update/{archived_ids[0]}/', json={
+            'title': 'Возвращена', 'status': 'В процессе', 'description': '',
+            'plan_date': cutoff.strftime('%d.%m.%Y')})
+        async with async_session() as db:
+            restored = await db.get(ToDo, archived_ids[0])
+        results.append(('изменённая архивная задача возвращается в todos с тем же id',
+                        response.status_code == 200 and restored is not None and restored.title == 'Возвращена'))
+
+        deleted = [(await client.delete(f'/api/tasks/delete/{archived_ids[1]}/')).status_code,
+                   (await client.post(f'/tasks/delete/{archived_ids[2]}/')).status_code]
+        edited = [(await client.get(f'/tasks/edit/{archived_ids[5]}/')).status_code,
+                  (await client.post(f'/tasks/update/{archived_ids[5]}/', data={
+                      'title': 'Веб', 'status': 'Выполнено', 'description': '',
+                      'plan_date': str(cutoff)})).status_code]
+        bulk = (await client.post('/api/tasks/bulk/', json={
+            'update': [{'id': archived_ids[3], 'title': 'Пакет', 'status': None, 'description': None,
+                        'plan_date': None}],
+            'delete': [archived_ids[4]]})).json()
+        results.append(('архивные задачи изменяются и удаляются в API, вебе и пакете',
+                        deleted == [204, 303] and edited == [200, 303] and bulk['update'][0]['status'] == 200
+                        and bulk['delete'][0]['status'] == 204))
+
+        changes = (await client.get('/api/tasks/changes/', params={'since': token})).json()
+        results.append(('синхронизация видит изменения и удаления архивных задач',
+                        {task['id'] for task in changes['upserts']}
+                        == {archived_ids[0], archived_ids[3], archived_ids[5]}
+                        and set(changes['deleted']) == {archived_ids[1], archived_ids[2], archived_ids[4]}))
+        results.append(('счётчики сходятся с пересчётом после правок архива',
+                        (await client.get('/api/tasks/stats/')).json()
+                        == (await client.post('/api/tasks/stats/recompute/')).json()))
+
+        # Без AUTOINCREMENT SQLite выдал бы новой задаче в пустой todos id 1, уже занятый в архиве
+        async with async_session() as db:
+            archived_ids = set((await db.execute(select(ToDoArchive.id))).scalars())
+            hot_ids = list((await db.execute(select(ToDo.id))).scalars())
+        for task_id in hot_ids:
+            await client.delete(f'/api/tasks/delete/{task_id}/')
+        response = await client.post('/api/tasks/create/', json={
+            'title': 'Новая', 'status': 'В планах', 'description': '',
+            'plan_date': cutoff.strftime('%d.%m.%Y')})
+        results.append(('id не повторяются после архивации и удаления',
+                        response.json()['id'] > max(archived_ids | set(hot_ids))))
+
+    ok = True
+    for name, passed in results:
+        print(f"{'OK  ' if passed else 'FAIL'} {name}")
+        ok = ok and passed
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    args = parser.parse_args()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/archive.db"
+    sys.exit(0 if asyncio.run(check(database_url)) else 1)
@@ -0,0 +1,99 @@
+"""Проверка шины инвалидации кэшей между воркерами на in-memory транспорте.
+
+Запуск:
+    python -m scripts.check_invalidation [--database-url URL]
+
+Второй "воркер" - отдельная шина на том же MemoryTransport. Проверяется, что он получает
+события о записи задач и об изменении пользователя только после коммита, не получает
+их при откате, и сколько времени проходит от коммита до доставки. С Postgres в
+--database-url и INVALIDATION_BACKEND=memory проверяется та же логика поверх Postgres.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+
+async def check(database_url: str) -> bool:
+    os.environ['SQLALCHEMY_DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'invalidation-check')
+    os.environ.setdefault('INVALIDATION_BACKEND', 'memory')
+    import httpx
+    from sqlalchemy import select, update
+    from main import app
+    from models import create_tables, User
+    from database import async_session
+    from invalidation import bus, InvalidationBus, MemoryTransport
+    from auth_cache import user_cache, load_user
+
+    await create_tables()
+    other = InvalidationBus(MemoryTransport(bus.transport.hub))
+    received = []
+    other.on('tasks')(lambda user_id, version: received.append(('tasks', user_id, time.perf_counter())))
+    other.on('user')(lambda *usernames: received.append(('user', usernames, time.perf_counter())))
+
+    username = f'bus-check-{uuid.uuid4().hex[:8]}'
+    payload = {'title': 'Шина', 'status': 'В планах', 'description': 'Проверка шины',
+               'plan_date': (date.today() + timedelta(days=1)).strftime('%d.%m.%Y')}
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://check') as client:
+        await client.post('/auth/register/', json={'username': username, 'email': f'{username}@example.com',
+                                                   'password': username})
+        response = await client.post('/auth/login/', data={'username': username, 'password': username})
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+
+        received.clear()
+        await client.post('/api/tasks/create/', json=payload)
+        results.append(('запись задачи доходит до другого воркера', [kind for kind, *_ in received] == ['tasks']))
+
+        received.clear()
+        await client.patch('/api/tasks/update/999999/', json=payload)
+        results.append(('откат не рассылает событий', received == []))
+
+    received.clear()
+    async with async_session() as db:
+        user = (await db.execute(select(User).filter(User.username == username))).scalars().one()
+        user.username = username + '-renamed'
+        await db.flush()
+        results.append(('до коммита событий нет', received == []))
+        committed = time.perf_counter()
+        await db.commit()
+    results.append(('смена имени сбрасывает старое и новое имя',
+                    bool(received) and set(received[0][1]) == {username, username + '-renamed'}))
+    if received:
+        print(f'от начала коммита до доставки: {(received[0][2] - committed) * 1000:.3f} мс')
+
+    renamed = username + '-renamed'
+    async with async_session() as db:
+        await load_user(renamed, db)
+    async with async_session() as db:
+        await db.execute(update(User).where(User.username == renamed).values(email=f'{renamed}@example.org'))
+        await db.commit()
+    results.append(('UPDATE users через Core сбрасывает кэш', user_cache.get(renamed) is None))
+
+    # Чтение началось до коммита изменения, а закончилось после: такой снимок в кэш не кладётся
+    generation = user_cache.generation
+    async with async_session() as db:
+        user = (await db.execute(select(User).filter(User.username == renamed))).scalars().one()
+        user.email = f'{renamed}@example.net'
+        await db.commit()
+    user_cache.set(renamed, object(), generation)
+    results.append(('устаревший снимок не попадает в кэш', user_cache.get(renamed) is None))
+
+    ok = True
+    for name, passed in results:
+        print(f"{'OK  ' if passed else 'FAIL'} {name}")
+        ok = ok and passed
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    args = parser.parse_args()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/invalidation.db"
+    sys.exit(0 if asyncio.run(check(database_url)) else 1)
@@ -0,0 +1,110 @@
+"""Проверка числа SQL-запросов, которое выполняет каждый эндпоинт задач.
+
+Запуск:
+    python -m scripts.check_query_counts [--database-url URL]
+
+По умолчанию используется временная база SQLite. Запросы идут в приложение in-process,
+число SQL-запросов считается через db_stats.max_queries. Пользователь к моменту проверки
+уже в кэше (auth_cache), поэтому аутентификация в бюджет не входит. Код выхода 1,
+если хотя бы один эндпоинт превысил свой бюджет или фильтр с неизвестным статусом не вернул 400.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+
+def task_payload(title: str) -> dict:
+    return {
+        'title': title,
+        'plan_date': (date.today() + timedelta(days=1)).strftime('%d.%m.%Y'),
+        'status': 'В планах',
+        'description': 'Проверка числа запросов',
+    }
+
+
+def web_form(title: str) -> dict:
+    return {'title': title, 'plan_date': str(date.today() + timedelta(days=1)), 'status': 'В процессе',
+            'description': 'Проверка числа запросов'}
+
+
+async def check(database_url: str) -> bool:
+    os.environ['SQLALCHEMY_DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'query-count-check')
+    import httpx
+    from main import app
+    from models import create_tables
+    from db_stats import max_queries
+
+    await create_tables()
+    username = f'query-check-{uuid.uuid4().hex[:8]}'
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://check') as client:
+        await client.post('/auth/register/', json={'username': username, 'email': f'{username}@example.com',
+                                                   'password': username})
+        response = await client.post('/auth/login/', data={'username': username, 'password': username})
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        await client.get('/api/tasks/mytasks/')
+        ids = [(await client.post('/api/tasks/create/', json=task_payload(f'Задача {i}'))).json()['id']
+               for i in range(4)]
+
+        etag = (await client.get('/api/tasks/mytasks/')).headers['etag']
+        ok = True
+        # Неизвестный статус в фильтре - ошибка клиента, а не 500
+        for url in ('/api/tasks/mytasks/?status=foo', '/tasks/search/?status=foo'):
+            status_code = (await client.get(url)).status_code
+            print(f"{'OK  ' if status_code == 400 else 'FAIL'} GET {url}: HTTP {status_code}")
+            ok = ok and status_code == 400
+
+        # (метод, путь, параметры запроса, максимум SQL-запросов)
+        budgets = [
+            # Условный GET без изменений: только чтение версии, задачи не читаются
+            ('GET', '/api/tasks/mytasks/', {'headers': {'If-None-Match': etag}}, 1),
+            ('POST', '/api/tasks/create/', {'json': task_payload('Новая задача')}, 2),
+            ('GET', '/api/tasks/mytasks/', {}, 2),
+            ('GET', '/api/tasks/mytasks/?query=Задача&limit=2', {}, 2),
+            # Запрос из одних пробелов - обычный список, а не ошибка FTS5
+            ('GET', '/api/tasks/mytasks/?query=%20%20', {}, 2),
+            ('PATCH', f'/api/tasks/update/{ids[0]}/', {'json': task_payload('Изменена')}, 2),
+            ('DELETE', f'/api/tasks/delete/{ids[0]}/', {}, 3),
+            # SQLite не гарантирует порядок строк в многострочном INSERT ... RETURNING, и SQLAlchemy
+            # вставляет там по одной строке, поэтому в пакете одно создание - бюджет одинаков для всех баз
+            ('POST', '/api/tasks/bulk/', {'json': {'create': [task_payload('Пакет')],
+                                                   'update': [{'id': ids[1], 'title': 'Пакет', 'plan_date': None,
+                                                               'status': None, 'description': None}],
+                                                   'delete': [ids[2]]}}, 6),
+            ('GET', '/api/tasks/changes/', {}, 2),
+            ('GET', '/api/tasks/changes/?since=1', {}, 3),
+            # Сводка - одним запросом: счётчики по статусу из todo_stats и подзапрос просроченных
+            ('GET', '/api/tasks/stats/', {}, 1),
+            ('GET', '/tasks/', {}, 1),
+            # Та же страница без изменений задач - из кэша отрендеренных страниц
+            ('GET', '/tasks/', {}, 0),
+            ('GET', '/tasks/search/?query=Задача&status=В планах', {}, 1),
+            ('GET', '/tasks/search/?query=%20', {}, 1),
+            ('POST', '/tasks/create/', {'data': web_form('Веб-задача')}, 2),
+            ('POST', f'/tasks/update/{ids[3]}/', {'data': web_form('Веб-изменение')}, 2),
+            ('POST', f'/tasks/delete/{ids[3]}/', {}, 3),
+        ]
+
+        for method, url, kwargs, budget in budgets:
+            try:
+                with max_queries(budget) as stats:
+                    response = await client.request(method, url, **kwargs)
+                failed = response.status_code >= 400
+                message = f'{stats.count}/{budget}' + (f' HTTP {response.status_code}' if failed else '')
+            except AssertionError as e:
+                failed, message = True, str(e)
+            print(f"{'FAIL' if failed else 'OK  '} {method} {url}: {message}")
+            ok = ok and not failed
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    args = parser.parse_args()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/query_counts.db"
+    sys.exit(0 if asyncio.run(check(database_url)) else 1)
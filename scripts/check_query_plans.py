@@ -0,0 +1,231 @@
+"""Проверка планов запросов к todos: каждый запрос роутеров должен обслуживаться своим индексом.
+
+Запуск:
+    python -m scripts.check_query_plans [--database-url URL] [--skip-negative-control]
+
+Без --database-url схема строится через models.create_tables во временной базе SQLite;
+база из --database-url должна быть с применёнными миграциями.
+
+Для каждого запроса задано, каким индексом должна читаться каждая таблица. В Postgres
+смотрится EXPLAIN (FORMAT JSON) с enable_seqscan = off: нужен узел плана с этим индексом
+и условием Index Cond - полный проход по индексу (например, по todos_pkey) не засчитывается.
+В SQLite в EXPLAIN QUERY PLAN нужна строка SEARCH по этому индексу, а не SCAN.
+
+Негативный контроль: в транзакции, которая потом откатывается, удаляются ожидаемые
+индексы, и те же проверки должны упасть - иначе проверка ничего не доказывает.
+DROP INDEX держит эксклюзивную блокировку todos до отката, поэтому на рабочей базе
+контроль стоит пропустить (--skip-negative-control). Код выхода 1, если хотя бы один
+запрос не прошёл или негативный контроль не сработал.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import date, timedelta
+from sqlalchemy import select, text, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+USER_ID = 1
+# Условные имена: первичный ключ и полнотекстовый индекс называются в диалектах по-разному
+PRIMARY_KEY = 'primary key'
+FULL_TEXT = 'full text'
+
+
+def route_queries(dialect: str) -> dict:
+    """Запрос роутера -> (выражение, {таблица: индекс, которым она должна читаться})."""
+    from models import ToDo, task_status
+    from task_queries import build_task_list, encode_cursor
+    from task_versions import build_changed_tasks
+    from archive import archive_candidates
+    from task_stats import count_overdue
+
+    today = date.today()
+
+    def task_list(**kwargs):
+        return build_task_list(dialect, USER_ID, **kwargs)[0]
+
+    by_date = {'todos': 'ix_todos_user_id_plan_date_id'}
+    by_status = {'todos': 'ix_todos_user_id_status_plan_date_id'}
+    with_archive = {**by_date, 'todos_archive': 'ix_todos_archive_user_id_plan_date_id'}
+    by_version = {'todos': 'ix_todos_user_id_version', 'todos_archive': 'ix_todos_archive_user_id_version'}
+    return {
+        'mytasks': (task_list(), by_date),
+        'mytasks after cursor': (task_list(after=encode_cursor(today, 100)), by_date),
+        'filter by status': (task_list(status=task_status.DONE.value), by_status),
+        'filter by status after cursor': (task_list(status=task_status.DONE.value,
+                                                    after=encode_cursor(today, 100)), by_status),
+        'filter by date range': (task_list(date_from=str(today), date_to=str(today + timedelta(days=30))), by_date),
+        'search': (task_list(query='молоко'), {'todos': FULL_TEXT}),
+        'mytasks with archive': (task_list(include_archived=True), with_archive),
+        'mytasks with archive after cursor': (task_list(include_archived=True, after=encode_cursor(today, 100)),
+                                              with_archive),
+        'search with archive': (task_list(query='молоко', include_archived=True),
+                                {'todos': FULL_TEXT, 'todos_archive': FULL_TEXT}),
+        'sync snapshot': (build_changed_tasks(USER_ID, token=100), by_version),
+        'sync snapshot after cursor': (build_changed_tasks(USER_ID, token=100, after=(50, 100)), by_version),
+        'sync changes': (build_changed_tasks(USER_ID, token=100, since=50), by_version),
+        'overdue count': (count_overdue(USER_ID, today), by_status),
+        'archive candidates': (archive_candidates(today), {'todos': 'ix_todos_status_plan_date_id'}),
+        'task by id and owner': (select(ToDo).filter(ToDo.id == 100, ToDo.user_id == USER_ID),
+                                 {'todos': PRIMARY_KEY}),
+    }
+
+
+def index_names(dialect: str, table: str, index: str) -> set[str]:
+    if index == PRIMARY_KEY:
+        # В Postgres у todos.id есть и ключ, и отдельный индекс ix_todos_id
+        return {f'{table}_pkey', f'ix_{table}_id'} if dialect == 'postgresql' else {index}
+    if index == FULL_TEXT:
+        return {f'ix_{table}_search_vector'} if dialect == 'postgresql' else {f'{table}_fts'}
+    return {index}
+
+
+def postgres_index_scans(plan) -> set[str]:
+    """Индексы, которые план читает по условию (узлы с Index Name и Index Cond)."""
+    found = set()
+    if isinstance(plan, dict):
+        if plan.get('Index Name') and plan.get('Index Cond'):
+            found.add(plan['Index Name'])
+        plan = list(plan.values())
+    if isinstance(plan, list):
+        for node in plan:
+            found |= postgres_index_scans(node)
+    return found
+
+
+def sqlite_searches(table: str, index: str, plan: list[str]) -> bool:
+    if index == PRIMARY_KEY:
+        pattern = rf'SEARCH {table} USING INTEGER PRIMARY KEY \('
+    elif index.endswith('_fts'):
+        # M - ограничение MATCH: FTS5 ищет по своему индексу, а не перебирает документы
+        pattern = rf'SCAN {index} VIRTUAL TABLE INDEX \d+:M'
+    else:
+        pattern = rf'SEARCH {table} USING (COVERING )?INDEX {index} \('
+    return any(re.match(pattern, line) for line in plan)
+
+
+def missing_indexes(dialect: str, plan, expected: dict) -> list[str]:
+    missing = []
+    for table, index in expected.items():
+        names = index_names(dialect, table, index)
+        if dialect == 'postgresql':
+            used = bool(names & postgres_index_scans(plan))
+        else:
+            used = any(sqlite_searches(table, name, plan) for name in names)
+        if not used:
+            missing.append(f'{table}: {" / ".join(sorted(names))}')
+    return missing
+
+
+async def explain(conn, dialect: str, sql: str):
+    if dialect == 'postgresql':
+        result = await conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql)
+        plan = result.scalar()
+        return json.loads(plan) if isinstance(plan, str) else plan
+    result = await conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)
+    return [row[-1] for row in result]
+
+
+async def run_checks(conn, engine, queries: dict, verbose: bool) -> dict[str, bool]:
+    dialect = engine.dialect.name
+    passed = {}
+    for name, (stmt, expected) in queries.items():
+        sql = str(stmt.compile(engine.sync_engine, compile_kwargs={'literal_binds': True}))
+        try:
+            plan = await explain(conn, dialect, sql)
+        except DBAPIError as e:
+            # В SQLite без таблицы FTS5 поисковый запрос не выполняется вовсе
+            plan, missing = [str(e.orig)], ['запрос не выполнился']
+        else:
+            missing = missing_indexes(dialect, plan, expected)
+        passed[name] = not missing
+        if verbose:
+            print(f"{'FAIL' if missing else 'OK  '} {name}")
+            for line in missing:
+                print('      нет поиска по индексу ' + line)
+            if missing:
+                lines = json.dumps(plan, indent=1).splitlines() if dialect == 'postgresql' else plan
+                for line in lines:
+                    print('      ' + line)
+    return passed
+
+
+def droppable(dialect: str, queries: dict) -> list[str]:
+    """DDL, убирающий ожидаемые индексы (кроме первичных ключей) для негативного контроля."""
+    statements = []
+    for _, expected in queries.values():
+        for table, index in expected.items():
+            if index == PRIMARY_KEY:
+                continue
+            for name in sorted(index_names(dialect, table, index)):
+                drop = f'DROP TABLE {name}' if name.endswith('_fts') else f'DROP INDEX {name}'
+                if drop not in statements:
+                    statements.append(drop)
+    return statements
+
+
+async def run_phase(database_url: str, queries: dict, drop: list[str], verbose: bool) -> dict[str, bool]:
+    # Свой engine на каждый проход: соединение SQLite кэширует подготовленные EXPLAIN и после
+    # DROP INDEX показало бы старые планы
+    engine = create_async_engine(database_url)
+    dialect = engine.dialect.name
+    try:
+        async with engine.connect() as conn:
+            if dialect == 'postgresql':
+                await conn.execute(text('SET enable_seqscan = off'))
+            elif drop:
+                # pysqlite сам открывает транзакцию только перед DML, а DDL должен откатиться
+                await conn.exec_driver_sql('BEGIN')
+            try:
+                for statement in drop:
+                    await conn.exec_driver_sql(statement)
+                return await run_checks(conn, engine, queries, verbose)
+            finally:
+                await conn.rollback()
+    finally:
+        await engine.dispose()
+
+
+async def create_schema(database_url: str):
+    """Схема приложения во временной базе: те же таблицы, индексы и триггеры, что дают миграции."""
+    os.environ.setdefault('SECRET_KEY', 'query-plans-check')
+    from database import Database, use_database
+    from settings import DatabaseSettings
+    from models import create_tables
+
+    database = use_database(Database(DatabaseSettings(url=database_url)))
+    try:
+        await create_tables()
+    finally:
+        await database.dispose()
+
+
+async def check(database_url: str, negative_control: bool = True) -> bool:
+    dialect = make_url(database_url).get_backend_name()
+    queries = route_queries(dialect)
+    ok = all((await run_phase(database_url, queries, [], verbose=True)).values())
+    if negative_control:
+        # Запросы только по первичному ключу в контроле не участвуют: ключ не удалить
+        controlled = {name: query for name, query in queries.items()
+                      if any(index != PRIMARY_KEY for index in query[1].values())}
+        passed = await run_phase(database_url, controlled, droppable(dialect, queries), verbose=False)
+        for name, result in passed.items():
+            print(f"{'FAIL' if result else 'OK  '} без индексов не проходит: {name}")
+        ok = ok and not any(passed.values())
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='по умолчанию временная база SQLite')
+    parser.add_argument('--skip-negative-control', action='store_true',
+                        help='не удалять индексы во временной транзакции (для рабочей базы)')
+    args = parser.parse_args()
+    if args.database_url is None:
+        args.database_url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/plans.db"
+        asyncio.run(create_schema(args.database_url))
+    sys.exit(0 if asyncio.run(check(args.database_url, not args.skip_negative_control)) else 1)
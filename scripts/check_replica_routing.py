@@ -0,0 +1,71 @@
+"""Проверка маршрутизации чтения на реплику на двух локальных базах SQLite.
+
+Запуск:
+    python -m scripts.check_replica_routing
+
+Основная база и "реплика" - два файла SQLite. Реплика - копия основной базы на момент
+старта, дальше она не обновляется, поэтому по числу видимых задач понятно, откуда
+прочитан ответ: сразу после своей записи пользователь должен читать с основной базы,
+а по истечении DB_READ_YOUR_WRITES_SECONDS - с реплики. Код выхода 1 при расхождении.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, timedelta
+
+PIN_SECONDS = 0.5
+
+
+def task_payload(title: str) -> dict:
+    return {'title': title, 'plan_date': (date.today() + timedelta(days=1)).strftime('%d.%m.%Y'),
+            'status': 'В планах', 'description': 'Проверка реплики'}
+
+
+async def check(selection: str) -> bool:
+    directory = tempfile.mkdtemp()
+    primary, replica = os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db')
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite+aiosqlite:///{primary}'
+    os.environ['DB_REPLICA_URLS'] = f'sqlite+aiosqlite:///{replica}'
+    os.environ['DB_REPLICA_SELECTION'] = selection
+    os.environ['DB_READ_YOUR_WRITES_SECONDS'] = str(PIN_SECONDS)
+    os.environ.setdefault('SECRET_KEY', 'replica-check')
+    import httpx
+    from main import app
+    from models import create_tables
+
+    await create_tables()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://check') as client:
+        await client.post('/auth/register/', json={'username': 'replica', 'email': 'replica@example.com',
+                                                   'password': 'replica'})
+        response = await client.post('/auth/login/', data={'username': 'replica', 'password': 'replica'})
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        for i in range(2):
+            await client.post('/api/tasks/create/', json=task_payload(f'Задача {i}'))
+        # "Репликация": снимок основной базы с двумя задачами
+        shutil.copyfile(primary, replica)
+        await client.post('/api/tasks/create/', json=task_payload('Только на основной'))
+
+        async def visible() -> int:
+            return len((await client.get('/api/tasks/mytasks/')).json())
+
+        checks = [('сразу после записи - основная база', await visible(), 3)]
+        await asyncio.sleep(PIN_SECONDS * 2)
+        checks.append(('после окна read-your-writes - реплика', await visible(), 2))
+        await client.post('/api/tasks/create/', json=task_payload('Ещё одна'))
+        checks.append(('после новой записи - снова основная база', await visible(), 4))
+
+    ok = True
+    for name, got, expected in checks:
+        print(f"{'OK  ' if got == expected else 'FAIL'} {name}: задач {got}, ожидалось {expected}")
+        ok = ok and got == expected
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--selection', default='round_robin', choices=['round_robin', 'least_loaded'])
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check(args.selection)) else 1)
@@ -0,0 +1,127 @@
+"""Проверка планировщика напоминаний на временной базе SQLite.
+
+Запуск:
+    python -m scripts.check_scheduler [--database-url URL]
+
+Пользователь создаёт задачи на сегодня и открывает поток SSE. Проход планировщика должен
+прислать в поток по событию due на каждую невыполненную задачу, на следующий день -
+overdue, а повторный проход - ничего. Проверяется также, что задание без обработчиков
+не двигает чекпоинт, а обработчики вызываются уже после коммита сдвига чекпоинта.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+DUE_TODAY = 3
+
+
+async def check(database_url: str) -> bool:
+    os.environ['SQLALCHEMY_DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'scheduler-check')
+    import httpx
+    from sqlalchemy import select
+    from main import app
+    from models import create_tables, SchedulerCheckpoint
+    from database import async_session
+    from scheduler import Scheduler, scheduler
+    from task_stream import stream_task_events
+    from auth_cache import load_user
+
+    async def checkpoint(job):
+        async with async_session() as db:
+            result = await db.execute(select(SchedulerCheckpoint.plan_date, SchedulerCheckpoint.last_id)
+                                      .where(SchedulerCheckpoint.job == job))
+            return tuple(result.one())
+
+    async def next_chunk(chunks: asyncio.Queue, timeout=1.0):
+        try:
+            return await asyncio.wait_for(chunks.get(), timeout)
+        except TimeoutError:
+            return ''
+
+    async def read_stream(user_id, chunks: asyncio.Queue):
+        # Поток читается в отдельной задаче: таймаут ожидания не должен отменять сам генератор
+        async for chunk in stream_task_events(user_id):
+            await chunks.put(chunk)
+
+    await create_tables()
+    username = f'scheduler-check-{uuid.uuid4().hex[:8]}'
+    today = date.today()
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://check') as client:
+        await client.post('/auth/register/', json={'username': username, 'email': f'{username}@example.com',
+                                                   'password': username})
+        response = await client.post('/auth/login/', data={'username': username, 'password': username})
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        for i in range(DUE_TODAY):
+            await client.post('/api/tasks/create/', json={
+                'title': f'Сегодня {i}', 'status': 'В планах', 'description': '',
+                'plan_date': today.strftime('%d.%m.%Y')})
+        await client.post('/api/tasks/create/', json={
+            'title': 'Уже сделано', 'status': 'Выполнено', 'description': '', 'plan_date': today.strftime('%d.%m.%Y')})
+        await client.post('/api/tasks/create/', json={
+            'title': 'Через неделю', 'status': 'В планах', 'description': '',
+            'plan_date': (today + timedelta(days=7)).strftime('%d.%m.%Y')})
+
+    # Чекпоинты начинают со вчерашнего дня, чтобы сегодняшние задачи попали в задания
+    yesterday = today - timedelta(days=1)
+    await scheduler.ensure_checkpoints(yesterday)
+
+    idle = Scheduler(jobs={'due': 0})
+    before = await checkpoint('due')
+    await idle.run_once(today)
+    results.append(('задание без обработчиков не двигает чекпоинт', await checkpoint('due') == before))
+
+    committed = []
+    probe = Scheduler(jobs={'due': 0}, batch_size=1)
+
+    @probe.on('due')
+    async def record_checkpoint(task):
+        # Отдельная сессия видит сдвиг, только если транзакция пачки уже закоммичена
+        committed.append((await checkpoint('due')) == (task.plan_date, task.id))
+        raise RuntimeError('ошибка обработчика не останавливает пачку')
+
+    await probe.run_batch('due', today)
+    results.append(('обработчик вызывается после коммита чекпоинта', committed == [True]))
+    # Возвращаем чекпоинт: задачу забрал пробный планировщик
+    async with async_session() as db:
+        await db.execute(SchedulerCheckpoint.__table__.update().where(SchedulerCheckpoint.job == 'due')
+                         .values(plan_date=before[0], last_id=before[1]))
+        await db.commit()
+
+    async with async_session() as db:
+        user = await load_user(username, db)
+    events = asyncio.Queue()
+    reader = asyncio.create_task(read_stream(user.id, events))
+    await next_chunk(events)
+    await scheduler.run_once(today)
+    chunk = await next_chunk(events)
+    results.append(('due по каждой невыполненной задаче на сегодня',
+                    chunk.count('event: due') == DUE_TODAY and 'Уже сделано' not in chunk))
+
+    await scheduler.run_once(today)
+    results.append(('повторный проход ничего не присылает', await next_chunk(events, 0.3) == ''))
+
+    await scheduler.run_once(today + timedelta(days=1))
+    chunk = await next_chunk(events)
+    results.append(('на следующий день - overdue', chunk.count('event: overdue') == DUE_TODAY
+                    and 'event: due' not in chunk))
+    reader.cancel()
+
+    ok = True
+    for name, passed in results:
+        print(f"{'OK  ' if passed else 'FAIL'} {name}")
+        ok = ok and passed
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    args = parser.parse_args()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/scheduler.db"
+    sys.exit(0 if asyncio.run(check(database_url)) else 1)
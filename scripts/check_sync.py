@@ -0,0 +1,79 @@
+"""Проверка срока хранения надгробий дельта-синхронизации на временной базе SQLite.
+
+Запуск:
+    python -m scripts.check_sync [--database-url URL]
+
+Пользователь удаляет задачу, затем очистка надгробий запускается с датой после срока
+хранения. Проверяется, что надгробие удалено, синхронизация со старым токеном получает 410,
+а с токеном после очистки и полная синхронизация работают как прежде. Заодно проверяется,
+что для todo_tombstones.todo_id не создаётся своя последовательность (SERIAL) в Postgres.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+
+async def check(database_url: str) -> bool:
+    os.environ['SQLALCHEMY_DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'sync-check')
+    import httpx
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+    from main import app
+    from models import create_tables, ToDoTombstone
+    from database import async_session
+    from task_versions import purge_tombstones, TOMBSTONE_RETENTION_DAYS
+
+    await create_tables()
+    username = f'sync-check-{uuid.uuid4().hex[:8]}'
+    results = []
+    ddl = str(CreateTable(ToDoTombstone.__table__).compile(dialect=postgresql.dialect()))
+    results.append(('todo_id без своей последовательности', 'SERIAL' not in ddl))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://check') as client:
+        await client.post('/auth/register/', json={'username': username, 'email': f'{username}@example.com',
+                                                   'password': username})
+        response = await client.post('/auth/login/', data={'username': username, 'password': username})
+        client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        ids = [(await client.post('/api/tasks/create/', json={
+            'title': f'Задача {i}', 'status': 'В планах', 'description': '',
+            'plan_date': date.today().strftime('%d.%m.%Y')})).json()['id'] for i in range(3)]
+        old_token = (await client.get('/api/tasks/changes/')).json()['token']
+        await client.delete(f'/api/tasks/delete/{ids[0]}/')
+        changes = (await client.get('/api/tasks/changes/', params={'since': old_token})).json()
+        results.append(('до очистки удаление приходит в синхронизацию', changes['deleted'] == [ids[0]]))
+
+        # Проход в пределах срока ничего не трогает
+        purged_early = await purge_tombstones()
+        purged = await purge_tombstones(date.today() + timedelta(days=TOMBSTONE_RETENTION_DAYS + 1))
+        async with async_session() as db:
+            left = (await db.execute(select(ToDoTombstone.todo_id))).scalars().all()
+        results.append(('надгробия удаляются только после срока хранения', purged_early == 0 and purged == 1
+                        and not left))
+
+        response = await client.get('/api/tasks/changes/', params={'since': old_token})
+        results.append(('токен старше очистки получает 410', response.status_code == 410))
+
+        snapshot = (await client.get('/api/tasks/changes/')).json()
+        response = await client.get('/api/tasks/changes/', params={'since': snapshot['token']})
+        results.append(('после полной синхронизации инкрементальная работает',
+                        {task['id'] for task in snapshot['upserts']} == set(ids[1:])
+                        and response.status_code == 200 and response.json()['deleted'] == []))
+
+    ok = True
+    for name, passed in results:
+        print(f"{'OK  ' if passed else 'FAIL'} {name}")
+        ok = ok and passed
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None, help='по умолчанию временная база SQLite')
+    args = parser.parse_args()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/sync.db"
+    sys.exit(0 if asyncio.run(check(database_url)) else 1)
@@ -1,19 +1,20 @@
-from environs import Env
 from datetime import datetime, timedelta, timezone
 import jwt
-from fastapi import Depends, HTTPException, status, Cookie, Request
+from jwt import PyJWTError, ExpiredSignatureError
+from fastapi import Depends, HTTPException, Request, status, Cookie
+from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from models import User
-from sqlalchemy.future import select
-from jwt import PyJWTError, ExpiredSignatureError
+from auth_cache import load_user, CurrentUser
+from settings import env
 
-env = Env()
-env.read_env()
 SECRET_KEY = env('SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# auto_error=False: у веб-интерфейса токен лежит в cookie, а не в заголовке
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/web/login/", auto_error=False)
+
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -23,16 +24,15 @@ def create_access_token(data: dict):
 
 
 async def get_current_user(
-        request: Request,
+        bearer_token: str | None = Depends(oauth2_scheme),
         access_token: str | None = Cookie(None, alias="access_token"),
         db: AsyncSession = Depends(get_db)
-):
-    if not access_token:
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            access_token = auth_header.split("Bearer ")[1]
-
-    if not access_token:
+) -> CurrentUser:
+    """Пользователь по токену из заголовка Authorization (API) или cookie access_token (веб)."""
+    token = bearer_token or access_token
+    if token and token.startswith("Bearer "):
+        token = token[len("Bearer "):]
+    if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Необходима аутентификация",
@@ -40,16 +40,7 @@ async def get_current_user(
         )
 
     try:
-        token = access_token.replace("Bearer ", "") if access_token.startswith("Bearer") else access_token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-
-        if not username:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Неверный фортокен токена",
-            )
-
     except ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -62,14 +53,26 @@ async def get_current_user(
             detail="Неверный токен аутентификации",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    username = payload.get("sub")
+    if not username:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный формат токена",
+        )
 
-    user = await db.execute(select(User).filter(User.username == username))
-    user = user.scalars().first()
-
+    user = await load_user(username, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден",
         )
-
     return user
+
+
+async def get_read_db(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+    """Сессия только для чтения: реплика, если пользователь недавно ничего не записывал."""
+    db = request.app.state.database.router.session_for(current_user.id)
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from environs import Env
+from sqlalchemy import make_url
+
+# .env читается один раз на процесс, остальные модули берут настройки через этот env
+env = Env()
+env.read_env()
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    url: str
+    echo: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # 0 - без ограничения; применяется только к Postgres через asyncpg
+    statement_timeout_ms: int = 0
+    # Кэш подготовленных выражений asyncpg на соединение, 0 отключает (нужно за pgbouncer)
+    prepared_statement_cache_size: int = 100
+    # Реплики для чтения (GET-списки); пусто - всё читается с основной базы
+    replica_urls: tuple[str, ...] = ()
+    # round_robin или least_loaded (меньше всего занятых соединений в пуле)
+    replica_selection: str = 'round_robin'
+    # Сколько секунд после своей записи пользователь читает с основной базы
+    read_your_writes_seconds: float = 5.0
+    # Соединений, которые открываются при старте воркера (не больше pool_size), 0 - не прогревать
+    warm_connections: int = 5
+
+    @property
+    def drivername(self) -> str:
+        return make_url(self.url).drivername
+
+
+def load_database_settings() -> DatabaseSettings:
+    url = env('SQLALCHEMY_DATABASE_URL')
+    with env.prefixed('DB_'):
+        pool_size = env.int('POOL_SIZE', 5)
+        return DatabaseSettings(
+            url=url,
+            echo=env.bool('ECHO', False),
+            pool_size=pool_size,
+            max_overflow=env.int('MAX_OVERFLOW', 10),
+            pool_timeout=env.float('POOL_TIMEOUT', 30.0),
+            pool_recycle=env.int('POOL_RECYCLE', 1800),
+            pool_pre_ping=env.bool('POOL_PRE_PING', True),
+            statement_timeout_ms=env.int('STATEMENT_TIMEOUT_MS', 0),
+            prepared_statement_cache_size=env.int('PREPARED_STATEMENT_CACHE_SIZE', 100),
+            replica_urls=tuple(env.list('REPLICA_URLS', [])),
+            replica_selection=env.str('REPLICA_SELECTION', 'round_robin'),
+            read_your_writes_seconds=env.float('READ_YOUR_WRITES_SECONDS', 5.0),
+            warm_connections=env.int('WARM_CONNECTIONS', pool_size),
+        )
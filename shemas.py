@@ -1,5 +1,5 @@
 
-from pydantic import BaseModel, EmailStr, field_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from models import task_status
 from datetime import datetime, date
 
@@ -44,6 +44,70 @@ class ToDoUpdate(BaseModel):
 
     @field_validator('plan_date')
     def validate_plan_date(cls, value):
+        if value is None:
+            return value
         if datetime.strptime(value, '%d.%m.%Y').date() < date.today():
             raise ValueError('Дата должна быть в будущем')
-        return datetime.strptime(value, '%d.%m.%Y').date()
\ No newline at end of file
+        return datetime.strptime(value, '%d.%m.%Y').date()
+
+
+BULK_MAX_ITEMS = 1000
+
+
+class ToDoBulkUpdate(ToDoUpdate):
+    id: int
+
+
+class ToDoBulkRequest(BaseModel):
+    # Элементы валидируются по одному в обработчике, чтобы ошибка в одной задаче не отклоняла весь пакет
+    create: list[dict] = Field(default=[], max_length=BULK_MAX_ITEMS)
+    update: list[dict] = Field(default=[], max_length=BULK_MAX_ITEMS)
+    delete: list[int] = Field(default=[], max_length=BULK_MAX_ITEMS)
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: int | None = None
+    status: int
+    detail: str | None = None
+
+
+class ToDoBulkResponse(BaseModel):
+    create: list[BulkItemResult]
+    update: list[BulkItemResult]
+    delete: list[BulkItemResult]
+
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: str
+
+
+class ToDoImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+
+
+class ToDoSyncItem(BaseModel):
+    id: int
+    title: str
+    created: datetime
+    plan_date: date
+    status: task_status
+    description: str | None
+    version: int
+
+
+class ToDoChangesResponse(BaseModel):
+    upserts: list[ToDoSyncItem]
+    deleted: list[int]
+    token: str
+    # Следующая страница полной синхронизации; токен действителен после последней страницы
+    next_cursor: str | None = None
+
+
+class ToDoStatsResponse(BaseModel):
+    total: int
+    by_status: dict[task_status, int]
+    overdue: int
@@ -0,0 +1,21 @@
+from collections.abc import Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from invalidation import bus
+
+
+def subscribe(callback: Callable[[int, int], None]):
+    """Подписчик получает (user_id, version) после коммита записи задач в любом воркере."""
+    return bus.on('tasks')(callback)
+
+
+def unsubscribe(callback: Callable[[int, int], None]):
+    bus.off('tasks', callback)
+
+
+def tasks_changed(db: AsyncSession, user_id: int, version: int):
+    """Откладывает уведомление об изменении задач пользователя до коммита транзакции.
+
+    Подписчики (кэши и т.п.) вызываются только после успешного коммита, при откате
+    накопленные события отбрасываются. Другие воркеры узнают о записи через шину инвалидации.
+    """
+    bus.publish(db, 'tasks', user_id, version)
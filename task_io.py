@@ -0,0 +1,189 @@
+import codecs
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from pydantic import ValidationError
+from sqlalchemy import select, insert, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session
+from models import ToDo, ToDoArchive
+from shemas import ToDoCreate
+from task_versions import bump_tasks_version
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FIELDS = ('id', 'title', 'status', 'description', 'plan_date', 'created')
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+def _export_row(row) -> dict:
+    return {
+        'id': row.id,
+        'title': row.title,
+        'status': row.status.value,
+        'description': row.description,
+        'plan_date': row.plan_date.isoformat(),
+        'created': row.created.isoformat() if row.created else None,
+    }
+
+
+def _ndjson_chunk(rows) -> str:
+    return ''.join(json.dumps(_export_row(row), ensure_ascii=False) + '\n' for row in rows)
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writerows(_export_row(row) for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_tasks(user_id: int, export_format: str):
+    """Отдаёт задачи пользователя, включая архивные, кусками по EXPORT_CHUNK_SIZE строк.
+
+    todos и todos_archive сливаются одним UNION ALL в общем порядке (plan_date, id).
+    Строки читаются серверным курсором (stream + yield_per), поэтому память не зависит
+    от числа задач, а первый кусок уходит клиенту сразу после первой выборки. Сессия своя:
+    генератор живёт дольше обработчика и его зависимостей.
+    """
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS).writeheader()
+        yield buffer.getvalue()
+    format_chunk = _csv_chunk if export_format == 'csv' else _ndjson_chunk
+
+    async with async_session() as db:
+        tasks = union_all(*(select(*(getattr(table, field) for field in EXPORT_FIELDS))
+                            .filter(table.user_id == user_id) for table in (ToDo, ToDoArchive))).subquery()
+        stmt = select(tasks) \
+            .order_by(tasks.c.plan_date, tasks.c.id) \
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            yield format_chunk(rows)
+
+
+def validation_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+    buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield buffer.rstrip('\r')
+
+
+async def _iter_records(chunks: AsyncIterator[bytes], import_format: str):
+    """Номер строки и словарь полей (или текст ошибки разбора) для каждой записи тела запроса."""
+    number = 0
+    if import_format == 'ndjson':
+        async for line in _iter_lines(chunks):
+            number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, f'Неверный JSON: {e}'
+                continue
+            yield number, record if isinstance(record, dict) else 'Ожидался JSON-объект'
+        return
+
+    header, record_lines = None, []
+    async for line in _iter_lines(chunks):
+        # Поле в кавычках может содержать перевод строки: запись закончена, когда кавычек чётное число
+        record_lines.append(line)
+        record = '\n'.join(record_lines)
+        if record.count('"') % 2:
+            continue
+        record_lines = []
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = values
+            continue
+        number += 1
+        if len(values) != len(header):
+            yield number, f'Ожидалось полей: {len(header)}, получено: {len(values)}'
+            continue
+        yield number, dict(zip(header, values))
+    if record_lines:
+        yield number + 1, 'Незакрытая кавычка в конце файла'
+
+
+async def _insert_batch(db: AsyncSession, user_id: int, tasks: list[ToDoCreate]):
+    version = await bump_tasks_version(db, user_id)
+    if db.bind.dialect.name == 'postgresql':
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            'todos', columns=['title', 'status', 'description', 'plan_date', 'user_id', 'version'],
+            records=[(task.title, task.status.name, task.description or '', task.plan_date, user_id, version)
+                     for task in tasks]
+        )
+    else:
+        await db.execute(insert(ToDo), [
+            dict(task.model_dump(), description=task.description or '', user_id=user_id, version=version)
+            for task in tasks
+        ])
+    await db.commit()
+
+
+def _report(summary: dict, number: int, detail: str):
+    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+        summary['errors'].append({'row': number, 'detail': detail})
+
+
+async def _flush(db: AsyncSession, user_id: int, summary: dict, batch: list[ToDoCreate], first_row: int, last_row: int):
+    try:
+        await _insert_batch(db, user_id, batch)
+    except Exception as e:
+        # Пачка откатывается целиком, уже записанные пачки остаются - клиент получает итог
+        print(e)
+        await db.rollback()
+        summary['failed'] += len(batch)
+        _report(summary, first_row, f'Строки {first_row}-{last_row} не записаны: проблемы у сервера')
+    else:
+        summary['imported'] += len(batch)
+
+
+async def import_tasks(db: AsyncSession, user_id: int, chunks: AsyncIterator[bytes], import_format: str) -> dict:
+    """Построчный импорт задач из CSV или NDJSON.
+
+    Записи проверяются правилами ToDoCreate и пишутся пачками по IMPORT_BATCH_SIZE
+    (COPY в Postgres, executemany в остальных базах), каждая пачка - своей транзакцией.
+    Если пачка не записалась, её строки считаются ошибочными, а импорт продолжается; если
+    тело не в UTF-8, импорт останавливается. В обоих случаях возвращается итог по уже
+    записанному. В памяти одновременно держится не больше одной пачки и MAX_REPORTED_ERRORS ошибок.
+    """
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    batch, first_row, number = [], 0, 0
+    try:
+        async for number, record in _iter_records(chunks, import_format):
+            try:
+                if isinstance(record, str):
+                    raise ValueError(record)
+                # Описание необязательно: в файле может не быть такого поля, в базе будет пустая строка
+                batch.append(ToDoCreate.model_validate({'description': None, **record}))
+            except ValueError as e:
+                summary['failed'] += 1
+                _report(summary, number, validation_detail(e) if isinstance(e, ValidationError) else str(e))
+                continue
+            first_row = first_row or number
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await _flush(db, user_id, summary, batch, first_row, number)
+                batch, first_row = [], 0
+    except UnicodeDecodeError:
+        _report(summary, number + 1, 'Неверная кодировка: ожидается UTF-8, импорт остановлен')
+    if batch:
+        await _flush(db, user_id, summary, batch, first_row, number)
+    return summary
@@ -0,0 +1,172 @@
+import base64
+import json
+from datetime import datetime, date
+from fastapi import HTTPException
+from sqlalchemy import Select, select, or_, and_, tuple_, func, table, column, literal_column, union_all, cast, \
+    Float, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import ToDo, ToDoArchive, task_status, SEARCH_CONFIG
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Колонки страницы списка: id и plan_date нужны курсору, остальное - ответу API и шаблону
+TASK_LIST_COLUMNS = (ToDo.id, ToDo.plan_date, ToDo.title, ToDo.created, ToDo.status, ToDo.description)
+# Релевантность округляется до целого: курсор хранит её точно, без сравнения float на равенство
+RANK_SCALE = 1_000_000
+# Символы синтаксиса tsquery, которые не должны попадать в запрос из пользовательского ввода
+TSQUERY_SPECIAL = str.maketrans({char: ' ' for char in "'&|!():*<>\\"})
+
+
+
+def filter_tasks(stmt: Select, status: str | None = None,
+                 date_from: str | None = None, date_to: str | None = None, model=ToDo) -> Select:
+    if status:
+        try:
+            stmt = stmt.filter(model.status == task_status(status))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный статус")
+    try:
+        if date_from:
+            date_from_obj = datetime.strptime(date_from, "%Y-%m-%d").date()
+            stmt = stmt.filter(model.plan_date >= date_from_obj)
+        if date_to:
+            date_to_obj = datetime.strptime(date_to, "%Y-%m-%d").date()
+            stmt = stmt.filter(model.plan_date <= date_to_obj)
+    except ValueError:
+        pass
+    return stmt
+
+
+def _search_terms(query: str, dialect: str) -> list[str]:
+    # В tsquery символы синтаксиса вырезаются, поэтому запрос из них одних тоже остаётся без слов
+    return (query.translate(TSQUERY_SPECIAL) if dialect == 'postgresql' else query).split()
+
+
+def _fts5_query(terms: list[str]) -> str:
+    # Каждое слово в кавычках, чтобы пользовательский ввод не разбирался как синтаксис FTS5
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _tsquery(terms: list[str]) -> str:
+    # Как и в FTS5: все слова обязательны, каждое ищется по префиксу
+    return " & ".join(f"'{term}':*" for term in terms)
+
+
+def _exact_rank(rank):
+    return cast(func.round(cast(rank, Float) * RANK_SCALE), BigInteger)
+
+
+def apply_search(stmt: Select, query: str, dialect: str, model=ToDo):
+    """Фильтр полнотекстового поиска по title+description и выражение релевантности.
+
+    Postgres - GIN-индекс по сгенерированной колонке search_vector, SQLite - таблица FTS5
+    todos_fts (todos_archive_fts для архива). На прочих диалектах остаётся ILIKE без
+    ранжирования (rank = None). Слова запроса на обоих диалектах ищутся по префиксу, а
+    релевантность - целое число (см. RANK_SCALE), чтобы курсор сравнивал её точно.
+    Запрос без слов (одни пробелы) не фильтрует ничего, как и отсутствие запроса.
+    """
+    terms = _search_terms(query, dialect)
+    if not terms:
+        # Пустой MATCH в FTS5 - синтаксическая ошибка, а пустой to_tsquery не находит ничего
+        return stmt, None
+    if dialect == 'postgresql':
+        search_vector = literal_column(f'{model.__tablename__}.search_vector')
+        tsquery = func.to_tsquery(SEARCH_CONFIG, _tsquery(terms))
+        return stmt.filter(search_vector.op('@@')(tsquery)), _exact_rank(func.ts_rank(search_vector, tsquery))
+    if dialect == 'sqlite':
+        fts_name = f'{model.__tablename__}_fts'
+        fts = table(fts_name, column('rowid'))
+        stmt = stmt.join(fts, fts.c.rowid == model.id).filter(
+            literal_column(fts_name).op('MATCH')(_fts5_query(terms))
+        )
+        # bm25 тем меньше, чем документ релевантнее
+        return stmt, _exact_rank(-func.bm25(literal_column(fts_name)))
+    query = query.strip()
+    return stmt.filter(or_(model.title.ilike(f"%{query}%"), model.description.ilike(f"%{query}%"))), None
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([value.isoformat() if isinstance(value, date) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+
+def _keyset(stmt: Select, rank, plan_date, task_id, after: str | None) -> Select:
+    try:
+        if rank is None:
+            if after:
+                last_date, last_id = decode_cursor(after)
+                stmt = stmt.filter(tuple_(plan_date, task_id) > tuple_(date.fromisoformat(last_date), int(last_id)))
+            return stmt.order_by(plan_date, task_id)
+        if after:
+            last_rank, last_id = decode_cursor(after)
+            if isinstance(last_rank, float):
+                raise ValueError(last_rank)
+            last_rank, last_id = int(last_rank), int(last_id)
+            stmt = stmt.filter(or_(rank < last_rank, and_(rank == last_rank, task_id > last_id)))
+        return stmt.order_by(rank.desc(), task_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+
+def _task_page(model, dialect: str, user_id: int, query: str | None, status: str | None,
+               date_from: str | None, date_to: str | None, limit: int, after: str | None, columns):
+    stmt = select(*(getattr(model, task_column.key) for task_column in columns)).filter(model.user_id == user_id)
+    stmt = filter_tasks(stmt, status, date_from, date_to, model)
+    rank = None
+    if query:
+        stmt, rank = apply_search(stmt, query, dialect, model)
+    if rank is not None:
+        stmt = stmt.add_columns(rank.label('rank'))
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    return _keyset(stmt, rank, model.plan_date, model.id, after).limit(limit + 1), rank
+
+
+def build_task_list(dialect: str, user_id: int, query: str | None = None, status: str | None = None,
+                    date_from: str | None = None, date_to: str | None = None,
+                    limit: int = DEFAULT_PAGE_SIZE, after: str | None = None, columns=TASK_LIST_COLUMNS,
+                    include_archived: bool = False):
+    """Запрос страницы задач пользователя и выражение релевантности (None без поиска).
+
+    Keyset-пагинация: без поиска порядок (plan_date, id), с поиском - (релевантность, id).
+    Страница читается по индексу с места курсора, поэтому её стоимость не зависит от глубины.
+    По умолчанию читается только todos; с ``include_archived`` та же страница берётся ещё
+    и из todos_archive, и обе ветки сливаются в одном порядке.
+    """
+    stmt, rank = _task_page(ToDo, dialect, user_id, query, status, date_from, date_to, limit, after, columns)
+    # В архиве только выполненные задачи
+    if not include_archived or (status and status != task_status.DONE.value):
+        return stmt, rank
+
+    archived, _ = _task_page(ToDoArchive, dialect, user_id, query, status, date_from, date_to, limit, after, columns)
+    # Каждая ветка уже отобрана по своему индексу с места курсора, сверху сливается
+    # не больше 2 * (limit + 1) строк
+    page = union_all(select(stmt.subquery()), select(archived.subquery())).subquery()
+    page_rank = None if rank is None else page.c.rank
+    return _keyset(select(page), page_rank, page.c.plan_date, page.c.id, None).limit(limit + 1), page_rank
+
+
+async def list_tasks(db: AsyncSession, user_id: int, query: str | None = None, status: str | None = None,
+                     date_from: str | None = None, date_to: str | None = None,
+                     limit: int = DEFAULT_PAGE_SIZE, after: str | None = None, include_archived: bool = False):
+    """Страница задач пользователя и курсор следующей страницы (или None).
+
+    Задачи возвращаются строками из TASK_LIST_COLUMNS, а не объектами ToDo: без гидрации ORM
+    и identity map, атрибуты (task.title, task.status) доступны так же.
+    """
+    stmt, rank = build_task_list(db.bind.dialect.name, user_id, query, status, date_from, date_to, limit, after,
+                                 include_archived=include_archived)
+    result = await db.execute(stmt)
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_task = rows[-1]
+        next_cursor = encode_cursor(last_task.plan_date if rank is None else last_task.rank, last_task.id)
+    return rows, next_cursor
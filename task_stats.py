@@ -0,0 +1,49 @@
+from datetime import date
+from sqlalchemy import select, delete, insert, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, ToDo, ToDoArchive, ToDoStats, task_status
+
+
+def count_overdue(user_id: int, today: date):
+    open_statuses = [status for status in task_status if status != task_status.DONE]
+    return select(func.count()).select_from(ToDo) \
+        .where(ToDo.user_id == user_id, ToDo.status.in_(open_statuses), ToDo.plan_date < today)
+
+
+async def get_task_stats(db: AsyncSession, user_id: int, today: date | None = None) -> dict:
+    """Сводка по задачам пользователя: счётчики по статусу из todo_stats и число просроченных.
+
+    Просрочка зависит от текущей даты, поэтому счётчиком не хранится: это подсчёт невыполненных
+    задач с прошедшей датой плана по индексу (user_id, status, plan_date). Архив в нём не
+    участвует - там только выполненные задачи.
+    """
+    overdue = count_overdue(user_id, today or date.today()).scalar_subquery()
+    result = await db.execute(
+        select(ToDoStats.status, ToDoStats.task_count, overdue.label('overdue')).where(ToDoStats.user_id == user_id)
+    )
+    by_status = {status: 0 for status in task_status}
+    overdue_count = 0
+    for row in result:
+        by_status[row.status] = row.task_count
+        overdue_count = row.overdue
+    return {'total': sum(by_status.values()), 'by_status': by_status, 'overdue': overdue_count}
+
+
+async def recompute_task_stats(db: AsyncSession, user_id: int) -> dict:
+    """Пересчитывает счётчики пользователя по todos и todos_archive (ремонт после сбоя или ручной правки данных)."""
+    # Все записи задач начинаются с UPDATE users (bump_tasks_version), так что блокировка строки
+    # пользователя не даёт триггерам поменять счётчики, пока они пересчитываются
+    await db.execute(select(User.id).where(User.id == user_id).with_for_update())
+    await db.execute(delete(ToDoStats).where(ToDoStats.user_id == user_id))
+    tasks = union_all(*(
+        select(model.user_id, model.status).where(model.user_id == user_id)
+        for model in (ToDo, ToDoArchive)
+    )).subquery()
+    await db.execute(insert(ToDoStats).from_select(
+        ['user_id', 'status', 'task_count'],
+        select(tasks.c.user_id, tasks.c.status, func.count())
+        .group_by(tasks.c.user_id, tasks.c.status)
+    ))
+    stats = await get_task_stats(db, user_id)
+    await db.commit()
+    return stats
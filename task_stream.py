@@ -0,0 +1,133 @@
+import asyncio
+from fastapi import HTTPException
+from database import async_session
+from json_response import dumps
+from metrics import registry
+from task_events import subscribe
+from invalidation import bus
+from task_versions import get_changes, get_tasks_version
+from settings import env
+
+SSE_KEEPALIVE_SECONDS = env.float('SSE_KEEPALIVE_SECONDS', 25.0)
+SSE_MAX_CONNECTIONS = env.int('SSE_MAX_CONNECTIONS', 50000)
+# Сколько потоков одновременно читают изменения из базы. При массовом переподключении
+# (деплой, обрыв сети) тысячи потоков иначе разом выбирают пул и вытесняют обычные запросы
+SSE_FETCH_CONCURRENCY = env.int('SSE_FETCH_CONCURRENCY', 4)
+# Неотправленных напоминаний на соединение: сверх этого медленный клиент их теряет
+SSE_MAX_REMINDERS = env.int('SSE_MAX_REMINDERS', 100)
+
+
+class _Listener:
+    """Состояние открытого потока. Уведомления о записях сливаются в флаг "есть изменения",
+    а сами изменения читаются, только когда клиент готов их принять. Список напоминаний
+    создаётся при первом напоминании, поэтому простаивающее соединение - одно asyncio.Event."""
+    __slots__ = ('wake', 'tasks_changed', 'reminders')
+
+    def __init__(self):
+        self.wake = asyncio.Event()
+        self.tasks_changed = False
+        self.reminders: list[str] | None = None
+
+
+# user_id -> открытые потоки пользователя
+_listeners: dict[int, set[_Listener]] = {}
+_connections = 0
+_fetch_slots = asyncio.Semaphore(SSE_FETCH_CONCURRENCY)
+
+
+def connections() -> int:
+    return _connections
+
+
+@subscribe
+def _notify(user_id: int, version: int):
+    for listener in _listeners.get(user_id, ()):
+        listener.tasks_changed = True
+        listener.wake.set()
+
+
+def _event(name: str, data, event_id: str | None = None) -> str:
+    prefix = f'id: {event_id}\n' if event_id else ''
+    return f'{prefix}event: {name}\ndata: {dumps(data).decode()}\n\n'
+
+
+@bus.on('reminder')
+def _remind(user_id: int, job: str, task: dict):
+    # Напоминания планировщика (reminders.py) приходят из любого воркера после коммита
+    listeners = _listeners.get(user_id)
+    if not listeners:
+        return
+    chunk = _event(job, task)
+    for listener in listeners:
+        if listener.reminders is None:
+            listener.reminders = []
+        if len(listener.reminders) < SSE_MAX_REMINDERS:
+            listener.reminders.append(chunk)
+        listener.wake.set()
+
+
+async def _changes_since(user_id: int, since: int | None) -> tuple[int, str]:
+    """Изменения после ``since`` одним куском SSE и новый токен; без ``since`` - только токен."""
+    async with _fetch_slots, async_session() as db:
+        if since is None:
+            token = await get_tasks_version(db, user_id)
+            return token, _event('sync', {'token': str(token)}, str(token))
+        try:
+            changes = await get_changes(db, user_id, since)
+        except HTTPException:
+            # Изменений больше SYNC_MAX_CHANGES: клиенту проще перечитать список целиком
+            token = await get_tasks_version(db, user_id)
+            return token, _event('resync', {'token': str(token)}, str(token))
+    chunk = ''.join(_event('upsert', dict(row)) for row in changes['upserts'])
+    chunk += ''.join(_event('delete', {'id': task_id}) for task_id in changes['deleted'])
+    return int(changes['token']), chunk + _event('sync', {'token': changes['token']}, changes['token'])
+
+
+def check_capacity():
+    if connections() >= SSE_MAX_CONNECTIONS:
+        raise HTTPException(status_code=503, detail='Слишком много подключений', headers={'Retry-After': '5'})
+
+
+async def stream_task_events(user_id: int, since: int | None = None):
+    """Поток Server-Sent Events об изменениях задач пользователя.
+
+    upsert - задача создана или изменена, delete - удалена, sync - токен, до которого клиент
+    получил все изменения (он же id события: браузер пришлёт его в Last-Event-ID при
+    переподключении). due и overdue - напоминания планировщика о задаче, без id: при
+    переподключении они не повторяются. Следующий кусок готовится только после отправки предыдущего, поэтому
+    медленный клиент не копит очередь - новые записи просто сливаются в одну выборку.
+    """
+    global _connections
+    listener = _Listener()
+    _listeners.setdefault(user_id, set()).add(listener)
+    _connections += 1
+    try:
+        token, chunk = await _changes_since(user_id, since)
+        yield chunk
+        while True:
+            try:
+                async with asyncio.timeout(SSE_KEEPALIVE_SECONDS):
+                    await listener.wake.wait()
+            except TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            listener.wake.clear()
+            chunk = ''
+            if listener.reminders:
+                chunk, listener.reminders = ''.join(listener.reminders), None
+            if listener.tasks_changed:
+                listener.tasks_changed = False
+                token, changes = await _changes_since(user_id, token)
+                chunk += changes
+            if chunk:
+                yield chunk
+    finally:
+        _connections -= 1
+        listeners = _listeners.get(user_id)
+        if listeners is not None:
+            listeners.discard(listener)
+            if not listeners:
+                del _listeners[user_id]
+
+
+registry.register_collector('sse', lambda: {'connections': connections(), 'users': len(_listeners)})
@@ -0,0 +1,181 @@
+import hashlib
+from datetime import date, datetime, timedelta
+from fastapi import HTTPException, Request
+from sqlalchemy import select, update, insert, delete, tuple_, union_all, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session
+from models import User, ToDo, ToDoArchive, ToDoTombstone
+from metrics import registry, Counter
+from task_events import tasks_changed
+from task_queries import encode_cursor, decode_cursor
+from settings import env
+
+# Предел изменений в инкрементальной синхронизации и размер страницы полной
+SYNC_MAX_CHANGES = 5000
+# Сколько дней хранятся надгробия: клиент, не синхронизировавшийся дольше, начинает с полной
+TOMBSTONE_RETENTION_DAYS = env.int('TOMBSTONE_RETENTION_DAYS', 90)
+TOMBSTONE_PURGE_BATCH_SIZE = env.int('TOMBSTONE_PURGE_BATCH_SIZE', 1000)
+TOMBSTONE_PURGE_MAX_BATCHES = env.int('TOMBSTONE_PURGE_MAX_BATCHES', 50)
+
+PURGED = registry.register(Counter('sync_tombstones_purged_total', 'Надгробия, удалённые по сроку хранения'))
+SYNC_COLUMNS = ('id', 'title', 'status', 'description', 'plan_date', 'created', 'version')
+
+
+async def bump_tasks_version(db: AsyncSession, user_id: int) -> int:
+    """Увеличивает версию задач пользователя в текущей транзакции и возвращает новое значение.
+
+    Вызывается перед записью задач: UPDATE блокирует строку пользователя до коммита,
+    поэтому конкурентные записи одного пользователя получают версии по порядку.
+    После коммита подписчики task_events получают уведомление об изменении.
+    """
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(tasks_version=User.tasks_version + 1)
+        .returning(User.tasks_version)
+        .execution_options(synchronize_session=False, user_snapshot_unchanged=True)
+    )
+    version = result.scalar_one()
+    tasks_changed(db, user_id, version)
+    return version
+
+
+async def record_deletions(db: AsyncSession, user_id: int, task_ids, version: int):
+    task_ids = list(task_ids)
+    if task_ids:
+        await db.execute(insert(ToDoTombstone), [
+            {'todo_id': task_id, 'user_id': user_id, 'version': version} for task_id in task_ids
+        ])
+
+
+async def get_tasks_version(db: AsyncSession, user_id: int) -> int:
+    # Кэш пользователей (auth_cache) версию не обновляет, поэтому читаем её из базы - это поиск по PK
+    result = await db.execute(select(User.tasks_version).where(User.id == user_id))
+    return result.scalar_one()
+
+
+def tasks_etag(request: Request, user_id: int, version: int) -> str:
+    # Параметры запроса входят в ETag: у разных страниц и фильтров разные ответы
+    params = '&'.join(f'{key}={value}' for key, value in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f'{user_id}:{version}:{params}'.encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag.removeprefix('W/')
+                                    for candidate in candidates)
+
+
+def build_changed_tasks(user_id: int, token: int, since: int | None = None, after: tuple[int, int] | None = None):
+    """Задачи пользователя с версией в (since, token] по (version, id), не больше SYNC_MAX_CHANGES + 1.
+
+    Архивные задачи остаются задачами пользователя, поэтому читаются обе таблицы: каждая ветка
+    отбирается по своему индексу (user_id, version), сверху сливается не больше двух страниц.
+    """
+    branches = []
+    for table in (ToDo, ToDoArchive):
+        stmt = select(*(getattr(table, name) for name in SYNC_COLUMNS)) \
+            .where(table.user_id == user_id, table.version <= token)
+        if since is not None:
+            stmt = stmt.where(table.version > since)
+        if after:
+            stmt = stmt.where(tuple_(table.version, table.id) > tuple_(*after))
+        branches.append(select(stmt.order_by(table.version, table.id).limit(SYNC_MAX_CHANGES + 1).subquery()))
+    page = union_all(*branches).subquery()
+    return select(page).order_by(page.c.version, page.c.id).limit(SYNC_MAX_CHANGES + 1)
+
+
+async def get_snapshot_page(db: AsyncSession, user_id: int, after: str | None = None) -> dict:
+    """Страница полной синхронизации: задачи и архив по (version, id), до SYNC_MAX_CHANGES за раз.
+
+    Токен читается на первой странице и переходит в курсор, поэтому все страницы ограничены
+    одной версией. Задача, изменённая или удалённая между страницами, уходит из снимка и
+    придёт клиенту в инкрементальной синхронизации с этим токеном.
+    """
+    position = None
+    if after:
+        try:
+            token, last_version, last_id = (int(value) for value in decode_cursor(after))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+        position = (last_version, last_id)
+    else:
+        token = await get_tasks_version(db, user_id)
+    result = await db.execute(build_changed_tasks(user_id, token, after=position))
+    rows = result.mappings().all()
+    next_cursor = None
+    if len(rows) > SYNC_MAX_CHANGES:
+        rows = rows[:SYNC_MAX_CHANGES]
+        next_cursor = encode_cursor(token, rows[-1]['version'], rows[-1]['id'])
+    return {'upserts': rows, 'deleted': [], 'token': str(token), 'next_cursor': next_cursor}
+
+
+async def get_changes(db: AsyncSession, user_id: int, since: int | None, after: str | None = None) -> dict:
+    """Задачи, изменённые после версии ``since``, удалённые после неё id и новый токен.
+
+    Без ``since`` - полная синхронизация страницами (get_snapshot_page, курсор ``after``).
+    Инкрементальная ограничена SYNC_MAX_CHANGES: при большем числе изменений - 410, и клиент
+    начинает полную; 410 и для ``since`` старше удалённых по сроку надгробий (users.purged_version). Токен читается до выборки изменений, а выборка ограничена им сверху:
+    запись, закоммиченная между этими запросами, попадёт в следующую синхронизацию, а не потеряется.
+    """
+    if since is None:
+        return await get_snapshot_page(db, user_id, after)
+    result = await db.execute(select(User.tasks_version, User.purged_version).where(User.id == user_id))
+    token, purged_version = result.one()
+    if since < purged_version:
+        # Надгробия после since уже удалены по сроку хранения - об удалениях клиент не узнает
+        raise HTTPException(status_code=410, detail='Токен устарел, нужна полная синхронизация')
+    result = await db.execute(
+        select(ToDoTombstone.todo_id)
+        .where(ToDoTombstone.user_id == user_id, ToDoTombstone.version > since, ToDoTombstone.version <= token)
+        .limit(SYNC_MAX_CHANGES + 1)
+    )
+    deleted = result.scalars().all()
+    result = await db.execute(build_changed_tasks(user_id, token, since))
+    rows = result.mappings().all()
+    if len(rows) + len(deleted) > SYNC_MAX_CHANGES:
+        raise HTTPException(status_code=410, detail='Слишком много изменений, нужна полная синхронизация')
+    return {'upserts': rows, 'deleted': deleted, 'token': str(token), 'next_cursor': None}
+
+
+async def purge_tombstones_batch(cutoff: datetime, batch_size: int = TOMBSTONE_PURGE_BATCH_SIZE) -> int:
+    """Удаляет до ``batch_size`` надгробий старше ``cutoff`` и поднимает users.purged_version.
+
+    Версия пользователя не растёт: задачи не меняются, меняется только то, с какого токена
+    ещё возможна инкрементальная синхронизация.
+    """
+    async with async_session() as db:
+        expired = select(ToDoTombstone.todo_id).where(ToDoTombstone.deleted < cutoff).limit(batch_size)
+        result = await db.execute(delete(ToDoTombstone).where(ToDoTombstone.todo_id.in_(expired))
+                                  .returning(ToDoTombstone.user_id, ToDoTombstone.version))
+        rows = result.all()
+        if not rows:
+            await db.rollback()
+            return 0
+        purged = {}
+        for user_id, version in rows:
+            purged[user_id] = max(purged.get(user_id, 0), version)
+        # Core executemany по порядку id: проходы разных воркеров не ждут друг друга крест-накрест
+        users = User.__table__
+        await db.execute(
+            update(users).where(users.c.id == bindparam('uid'), users.c.purged_version < bindparam('version'))
+            .values(purged_version=bindparam('version')).execution_options(user_snapshot_unchanged=True),
+            [{'uid': user_id, 'version': version} for user_id, version in sorted(purged.items())]
+        )
+        await db.commit()
+    PURGED.inc(amount=len(rows))
+    return len(rows)
+
+
+async def purge_tombstones(today: date | None = None) -> int:
+    """Один проход очистки надгробий: пачки по отдельным транзакциям, пока есть что удалять."""
+    cutoff = datetime.combine(today or date.today(), datetime.min.time()) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    purged = 0
+    for _ in range(TOMBSTONE_PURGE_MAX_BATCHES):
+        batch = await purge_tombstones_batch(cutoff)
+        purged += batch
+        if batch < TOMBSTONE_PURGE_BATCH_SIZE:
+            break
+    return purged
@@ -0,0 +1,44 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from settings import env
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATE_DIRS = [BASE_DIR / 'html', BASE_DIR / 'web_service' / 'static' / 'html']
+TEMPLATE_CACHE_DIR = Path(env.str('TEMPLATE_CACHE_DIR', str(BASE_DIR / '.jinja_cache')))
+# В продакшене шаблоны не меняются на лету, проверка mtime на каждый рендер не нужна
+TEMPLATE_AUTO_RELOAD = env.bool('TEMPLATE_AUTO_RELOAD', False)
+STREAM_CHUNK_SIZE = env.int('TEMPLATE_STREAM_CHUNK_SIZE', 64 * 1024)
+
+TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIRS),
+    bytecode_cache=FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR)),
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    autoescape=True,
+    cache_size=-1,
+)
+templates = Jinja2Templates(env=environment)
+
+
+def precompile() -> int:
+    """Компилирует все шаблоны заранее (при старте), байткод берётся из кэша на диске."""
+    names = environment.list_templates(extensions=['html'])
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
+
+async def render_chunks(name: str, context: dict, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Рендерит шаблон по частям: в памяти держится один кусок, а не вся страница."""
+    buffer, size = [], 0
+    for part in environment.get_template(name).generate(context):
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import anyio
+from sqlalchemy import select
+from database import Database, warm_up_pool
+from metrics import registry
+from models import User
+from passwords import password_hasher
+from task_queries import list_tasks
+from task_stats import get_task_stats
+from templating import precompile
+from settings import env
+
+STARTUP_WARMUP = env.bool('STARTUP_WARMUP', True)
+# Несуществующий пользователь: горячие запросы проходят целиком, но ничего не находят
+PRIME_USER_ID = 0
+
+_timings: dict[str, float] = {}
+
+
+async def _timed(step: str, coroutine):
+    start = time.perf_counter()
+    try:
+        await coroutine
+    except Exception as e:
+        print(e)
+    _timings[step] = time.perf_counter() - start
+
+
+async def prime_queries(sessions):
+    """Выполняет запросы горячих эндпоинтов, чтобы SQLAlchemy скомпилировал их до первого запроса.
+
+    Кэш скомпилированных выражений свой у каждого engine, поэтому реплики прогреваются отдельно.
+    """
+    async with sessions() as db:
+        await db.execute(select(User).filter(User.username == ''))
+        await db.execute(select(User.tasks_version).where(User.id == PRIME_USER_ID))
+        await list_tasks(db, PRIME_USER_ID)
+        await list_tasks(db, PRIME_USER_ID, query='прогрев')
+        await list_tasks(db, PRIME_USER_ID, include_archived=True)
+        await get_task_stats(db, PRIME_USER_ID)
+
+
+async def warm_up_streaming():
+    # StreamingResponse (страницы списка, SSE) работает через task group anyio, а его
+    # asyncio-backend импортируется лениво, на первом таком ответе
+    async with anyio.create_task_group():
+        pass
+
+
+async def warm_up(database: Database):
+    """Прогрев воркера перед приёмом запросов: шаблоны, соединения пулов, bcrypt и горячие запросы."""
+    start = time.perf_counter()
+    precompile()
+    _timings['templates'] = time.perf_counter() - start
+    await _timed('streaming', warm_up_streaming())
+    await asyncio.gather(
+        _timed('db_pool', asyncio.gather(*(warm_up_pool(db_engine, database.settings.warm_connections)
+                                           for db_engine in (database.engine, *database.replica_engines)))),
+        _timed('password_hasher', password_hasher.warm_up()),
+    )
+    await _timed('queries', asyncio.gather(prime_queries(database.sessions),
+                                           *(prime_queries(sessions) for _, sessions in database.router.replicas)))
+    _timings['total'] = time.perf_counter() - start
+
+
+def stats() -> dict:
+    return {f'{step}_seconds': seconds for step, seconds in _timings.items()}
+
+
+registry.register_collector('startup', stats)
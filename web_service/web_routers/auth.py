@@ -2,16 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.templating import Jinja2Templates
 from database import get_db
 from models import User
-from passlib.context import CryptContext
-from web_service.security import create_access_token
+from passwords import password_hasher
+from rate_limit import login_rate_limit, register_rate_limit, login_failed, login_succeeded
+from security import create_access_token
+from templating import templates
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 web_router = APIRouter(prefix="/web", tags=["auth-web"])
-templates = Jinja2Templates(directory='web_service/static/html')
 
 
 @web_router.get('/register/', response_class=HTMLResponse)
@@ -19,14 +18,15 @@ def register_form(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
 
-@web_router.post('/register/', response_class=RedirectResponse)
+@web_router.post('/register/', response_class=RedirectResponse,
+                  dependencies=[Depends(register_rate_limit)])
 async def register(request: Request, username: str = Form(), email: str = Form(),
                    password: str = Form(), db: AsyncSession = Depends(get_db)):
     existing_user = await db.execute(select(User).filter((User.username == username) | (User.email == email)))
     if existing_user.scalars().first():
         return RedirectResponse("/auth/register/?error=Пользователь с таким именем или почтой уже существует",
                                 status_code=303)
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await password_hasher.hash(password)
 
     new_user = User(username=username,
                     email=email,
@@ -42,21 +42,24 @@ def register_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 
-@web_router.post("/login/", response_class=RedirectResponse)
+@web_router.post("/login/", response_class=RedirectResponse, dependencies=[Depends(login_rate_limit)])
 async def login(request: Request, username: str = Form(), password: str = Form(),
                 db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.username == username))
     user = result.scalars().first()
     if not user:
+        await login_failed(username)
         return RedirectResponse(
             "/web/login/?error=Неверное имя пользователя или пароль",
             status_code=303
         )
-    if not pwd_context.verify(password, user.hash_password):
+    if not await password_hasher.verify(password, user.hash_password):
+        await login_failed(username)
         return RedirectResponse(
             "/tasks/login/?error=Неверное имя пользователя или пароль",
             status_code=303
         )
+    await login_succeeded(request, username)
     access_token = create_access_token(data={"sub": username})
     response = RedirectResponse(url="/tasks/", status_code=303)
     response.set_cookie(key="access_token", value=f"Bearer {access_token}", httponly=True)
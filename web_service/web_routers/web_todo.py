@@ -1,65 +1,82 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
-from sqlalchemy import select, delete
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
+from sqlalchemy import select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from models import User, ToDo, task_status
-from web_service.security import get_current_user
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import or_
+from models import ToDo, ToDoArchive, task_status
+from archive import restore_archived, delete_archived
+from security import get_current_user, get_read_db
+from auth_cache import CurrentUser
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from task_versions import bump_tasks_version, record_deletions
+from task_queries import list_tasks, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from page_cache import page_cache, page_key
+from templating import templates, render_chunks
+from task_stream import stream_task_events, check_capacity
 
 router = APIRouter(prefix="/tasks", tags=["Web tasks"])
-templates = Jinja2Templates(directory='web_service/static/html/')
 
 
 @router.get('/', response_class=HTMLResponse)
 async def get_tasks(request: Request, query: str | None = None, status: str | None = None, date_from: str | None = None,
-                    date_to: str | None = None, db: AsyncSession = Depends(get_db),
-                    current_user: User = Depends(get_current_user)):
-    return await search_tasks(request, query, status, date_from, date_to, db, current_user)
+                    date_to: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                    after: str | None = None, include_archived: bool = False, db: AsyncSession = Depends(get_read_db),
+                    current_user: CurrentUser = Depends(get_current_user)):
+    return await search_tasks(request, query, status, date_from, date_to, limit, after, include_archived, db,
+                              current_user)
 
 
 @router.get('/search/', response_class=HTMLResponse)
 async def search_tasks(request: Request, query: str | None = None, status: str | None = None,
-                       date_from: str | None = None, date_to: str | None = None, db: AsyncSession = Depends(get_db),
-                       current_user: User = Depends(get_current_user)):
-    stmt = select(ToDo).filter(ToDo.user_id == current_user.id)
-    if query:
-        stmt = stmt.filter(
-            or_(
-                ToDo.title.ilike(f"%{query}%"),
-                ToDo.description.ilike(f"%{query}%")
-            )
-        )
-
-    if status:
-        status_enum = task_status(status)
-        stmt = stmt.filter(ToDo.status == status_enum)
-
-    try:
-        if date_from:
-            date_from_obj = datetime.strptime(date_from, "%Y-%m-%d").date()
-            stmt = stmt.filter(ToDo.plan_date >= date_from_obj)
-
-        if date_to:
-            date_to_obj = datetime.strptime(date_to, "%Y-%m-%d").date()
-            stmt = stmt.filter(ToDo.plan_date <= date_to_obj)
-    except ValueError:
-        pass
-
-    result = await db.execute(stmt)
-    tasks = result.scalars().all()
-
-    return templates.TemplateResponse("/task.html", {
+                       date_from: str | None = None, date_to: str | None = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str | None = None,
+                       include_archived: bool = False,
+                       db: AsyncSession = Depends(get_read_db), current_user: CurrentUser = Depends(get_current_user)):
+    # Повторный показ той же страницы отдаётся из кэша без запросов к базе и рендеринга
+    key = page_key(query, status, date_from, date_to, limit, after, include_archived)
+    body = page_cache.get(current_user.id, key)
+    if body is not None:
+        return HTMLResponse(body)
+    generation = page_cache.generation(current_user.id)
+
+    tasks, next_cursor = await list_tasks(db, current_user.id, query, status, date_from, date_to, limit, after,
+                                          include_archived)
+
+    next_url = None
+    if next_cursor:
+        params = {"query": query, "status": status, "date_from": date_from, "date_to": date_to, "limit": limit,
+                  "include_archived": "true" if include_archived else None}
+        next_url = "/tasks/search/?" + urlencode({k: v for k, v in params.items() if v} | {"after": next_cursor})
+
+    # Страница рендерится и отдаётся по частям, параллельно складываясь в кэш
+    chunks = render_chunks("task.html", {
         "request": request,
         "tasks": tasks,
         "user": current_user,
         "search_query": query or "",
         "selected_status": status or "",
         "date_from": date_from or "",
-        "date_to": date_to or ""
+        "date_to": date_to or "",
+        "include_archived": include_archived,
+        "next_url": next_url
     })
+    return StreamingResponse(page_cache.store_stream(current_user.id, key, generation, chunks),
+                             media_type="text/html")
+
+
+@router.get('/events/')
+async def task_events(request: Request, since: int | None = Query(None, ge=0), db: AsyncSession = Depends(get_db),
+                      current_user: CurrentUser = Depends(get_current_user)):
+    # Переподключившийся EventSource продолжает с последнего полученного токена
+    last_event_id = request.headers.get('last-event-id', '')
+    if since is None and last_event_id.isdigit():
+        since = int(last_event_id)
+    check_capacity()
+    # Соединение с базой не держим, пока поток открыт
+    await db.close()
+    return StreamingResponse(stream_task_events(current_user.id, since), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.get('/create/', response_class=HTMLResponse)
@@ -73,10 +90,11 @@ async def create_task(request: Request,
                       description: str = Form(None),
                       plan_date: str = Form(),
                       db: AsyncSession = Depends(get_db),
-                      current_user: User = Depends(get_current_user)):
+                      current_user: CurrentUser = Depends(get_current_user)):
     new_task = ToDo(title=title, status=task_status(status), description=description,
                     plan_date=datetime.strptime(plan_date, "%Y-%m-%d").date(), user_id=current_user.id)
     try:
+        new_task.version = await bump_tasks_version(db, current_user.id)
         db.add(new_task)
         await db.commit()
     except Exception as e:
@@ -87,11 +105,20 @@ async def create_task(request: Request,
     return RedirectResponse(url="/tasks/", status_code=303)
 
 
+async def get_own_task(db: AsyncSession, task_id: int, user_id: int):
+    # Архивные задачи тоже можно открыть для изменения и удаления
+    for table in (ToDo, ToDoArchive):
+        result = await db.execute(select(table).filter(table.id == task_id, table.user_id == user_id))
+        task = result.scalars().first()
+        if task:
+            return task
+    return None
+
+
 @router.get('/edit/{task_id}/', response_class=HTMLResponse)
-async def update_task_form(request: Request, task_id: int, db: AsyncSession = Depends(get_db),
-                           current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id))
-    task = result.scalars().first()
+async def update_task_form(request: Request, task_id: int, db: AsyncSession = Depends(get_read_db),
+                           current_user: CurrentUser = Depends(get_current_user)):
+    task = await get_own_task(db, task_id, current_user.id)
 
     if not task:
         return RedirectResponse("/tasks/edit/?error=Не существует такой записи",
@@ -108,29 +135,35 @@ async def update_task_form(request: Request, task_id: int, db: AsyncSession = De
 async def update_task(request: Request, task_id: int, title: str = Form(),
                       status: str = Form(default=task_status.PLANNED),
                       description: str = Form(None), plan_date: str = Form(), db: AsyncSession = Depends(get_db),
-                      current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id))
-    task = result.scalars().first()
-    if not task:
-        raise HTTPException(status_code=404)
-    task.title = title
-    task.status = task_status(status)
-    task.description = description
-    task.plan_date = datetime.strptime(plan_date, "%Y-%m-%d").date()
+                      current_user: CurrentUser = Depends(get_current_user)):
+    stmt = update(ToDo).where(ToDo.id == task_id, ToDo.user_id == current_user.id).values(
+        title=title,
+        status=task_status(status),
+        description=description,
+        plan_date=datetime.strptime(plan_date, "%Y-%m-%d").date()
+    ).returning(ToDo.id)
     try:
-        await db.commit()
+        stmt = stmt.values(version=await bump_tasks_version(db, current_user.id))
+        result = await db.execute(stmt)
+        updated_id = result.scalars().first()
+        # Архивная задача меняется после возврата в todos
+        if updated_id is None and await restore_archived(db, current_user.id, [task_id]):
+            result = await db.execute(stmt)
+            updated_id = result.scalars().first()
+        await (db.commit() if updated_id is not None else db.rollback())
     except Exception as e:
         print(e)
         await db.rollback()
         raise HTTPException(status_code=500)
+    if updated_id is None:
+        raise HTTPException(status_code=404)
     return RedirectResponse(url='/tasks/', status_code=303)
 
 
 @router.get('/delete/{task_id}/', response_class=HTMLResponse)
-async def update_task_form(request: Request, task_id: int, db: AsyncSession = Depends(get_db),
-                           current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id))
-    task = result.scalars().first()
+async def update_task_form(request: Request, task_id: int, db: AsyncSession = Depends(get_read_db),
+                           current_user: CurrentUser = Depends(get_current_user)):
+    task = await get_own_task(db, task_id, current_user.id)
 
     if not task:
         return RedirectResponse("/tasks/delete/?error=Не существует такой записи",
@@ -144,17 +177,23 @@ async def update_task_form(request: Request, task_id: int, db: AsyncSession = De
 
 
 @router.post('/delete/{task_id}/', response_class=RedirectResponse)
-async def delete_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(ToDo).filter(ToDo.id == task_id, ToDo.user_id == current_user.id))
-    task = result.scalars().first()
-
-    if not task:
-        raise HTTPException(status_code=404)
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     try:
-        await db.execute(delete(ToDo).where(ToDo.id == task_id))
-        await db.commit()
+        version = await bump_tasks_version(db, current_user.id)
+        result = await db.execute(delete(ToDo).where(ToDo.id == task_id, ToDo.user_id == current_user.id)
+                                  .returning(ToDo.id))
+        deleted_id = result.scalars().first()
+        if deleted_id is None:
+            deleted_id = next(iter(await delete_archived(db, current_user.id, [task_id])), None)
+        if deleted_id is not None:
+            await record_deletions(db, current_user.id, [deleted_id], version)
+            await db.commit()
+        else:
+            await db.rollback()
     except Exception as e:
         print(e)
         await db.rollback()
         raise HTTPException(status_code=500)
+    if deleted_id is None:
+        raise HTTPException(status_code=404)
     return RedirectResponse(url='/tasks/', status_code=303)